@@ -1,13 +1,38 @@
 import streamlit as st
 import zipfile
-import io
 import os
-import re
+import sys
 import pandas as pd
 import random
-import gc
 import shutil
-import pdfplumber
+
+# O motor fica no pacote garimpeiro, na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from garimpeiro.garimpo import (
+    TEMP_EXTRACT_DIR,
+    TEMP_UPLOADS_DIR,
+    WORKERS_PADRAO,
+    garimpar_lote,
+    ler_upload,
+    nome_disponivel,
+    salvar_upload,
+)
+from garimpeiro.indice import (
+    INDICE_DB,
+    abrir_documentos,
+    abrir_indice,
+    buscar_documentos,
+    ler_documento,
+    localizar_documentos,
+    registrar_documentos,
+)
+from garimpeiro.exportacao import exportar_pacotes, gravar_documento, gravar_relatorio
+from garimpeiro.auditoria import ARQUIVO_MANUAL, MotorAuditoria
+from garimpeiro.autenticidade import ler_relatorio_autenticidade
+from garimpeiro.cache_xml import CacheResumos
+from garimpeiro.dominio import ler_relatorio_dominio
+from garimpeiro.sessao import apagar_sessao, listar_sessoes, restaurar_sessao, salvar_sessao
 
 # --- CONFIGURAÇÃO E ESTILO (CLONE ABSOLUTO DO DIAMOND TAX) ---
 st.set_page_config(page_title="GARIMPEIRO", layout="wide", page_icon="⛏️")
@@ -95,189 +120,9 @@ def aplicar_estilo_premium():
 
 aplicar_estilo_premium()
 
-# --- VARIÁVEIS DE SISTEMA DE ARQUIVOS (PREVENÇÃO DE QUEDA DE MEMÓRIA) ---
-TEMP_EXTRACT_DIR = "temp_garimpo_zips"
-TEMP_UPLOADS_DIR = "temp_garimpo_uploads"
-MAX_XML_PER_ZIP = 8000  # Trava de segurança para impedir queda do Streamlit (gera zips de ~20MB)
-
-# --- MOTOR DE IDENTIFICAÇÃO ---
-def identify_xml_info(content_bytes, client_cnpj, file_name):
-    client_cnpj_clean = "".join(filter(str.isdigit, str(client_cnpj))) if client_cnpj else ""
-    nome_puro = os.path.basename(file_name)
-    if nome_puro.startswith('.') or nome_puro.startswith('~') or not nome_puro.lower().endswith('.xml'):
-        return None, False
-    
-    resumo = {
-        "Arquivo": nome_puro, 
-        "Chave": "", 
-        "Tipo": "Outros", 
-        "Série": "0",
-        "Número": 0, 
-        "Status": "NORMAIS", 
-        "Pasta": "",
-        "Valor": 0.0, 
-        "Conteúdo": b"", 
-        "Ano": "0000", 
-        "Mes": "00",
-        "Operacao": "SAIDA", 
-        "Data_Emissao": "",
-        "CNPJ_Emit": "", 
-        "Nome_Emit": "", 
-        "Doc_Dest": "", 
-        "Nome_Dest": ""
-    }
-    
-    try:
-        content_str = content_bytes[:45000].decode('utf-8', errors='ignore')
-        tag_l = content_str.lower()
-        if '<?xml' not in tag_l and '<inf' not in tag_l and '<inut' not in tag_l and '<retinut' not in tag_l: 
-            return None, False
-        
-        # Identificação de tpNF (0=Entrada, 1=Saída)
-        tp_nf_match = re.search(r'<tpnf>([01])</tpnf>', tag_l)
-        if tp_nf_match:
-            if tp_nf_match.group(1) == "0":
-                resumo["Operacao"] = "ENTRADA"
-            else:
-                resumo["Operacao"] = "SAIDA"
-
-        # Extração de Dados das Partes
-        resumo["CNPJ_Emit"] = re.search(r'<emit>.*?<cnpj>(\d+)</cnpj>', tag_l, re.S).group(1) if re.search(r'<emit>.*?<cnpj>(\d+)</cnpj>', tag_l, re.S) else ""
-        resumo["Nome_Emit"] = re.search(r'<emit>.*?<xnome>(.*?)</xnome>', tag_l, re.S).group(1).upper() if re.search(r'<emit>.*?<xnome>(.*?)</xnome>', tag_l, re.S) else ""
-        resumo["Doc_Dest"] = re.search(r'<dest>.*?<(?:cnpj|cpf)>(.*?)</(?:cnpj|cpf)>', tag_l, re.S).group(1) if re.search(r'<dest>.*?<(?:cnpj|cpf)>(.*?)</(?:cnpj|cpf)>', tag_l, re.S) else ""
-        resumo["Nome_Dest"] = re.search(r'<dest>.*?<xnome>(.*?)</xnome>', tag_l, re.S).group(1).upper() if re.search(r'<dest>.*?<xnome>(.*?)</xnome>', tag_l, re.S) else ""
-
-        # Data de Emissão Genérica
-        data_match = re.search(r'<(?:dhemi|demi|dhregevento|dhrecbto)>(\d{4})-(\d{2})-(\d{2})', tag_l)
-        if data_match: 
-            resumo["Data_Emissao"] = f"{data_match.group(1)}-{data_match.group(2)}-{data_match.group(3)}"
-            resumo["Ano"] = data_match.group(1)
-            resumo["Mes"] = data_match.group(2)
-
-        # 1. IDENTIFICAÇÃO DE INUTILIZADAS
-        if '<inutnfe' in tag_l or '<retinutnfe' in tag_l or '<procinut' in tag_l:
-            resumo["Status"] = "INUTILIZADOS"
-            resumo["Tipo"] = "NF-e"
-            
-            if '<mod>65</mod>' in tag_l: 
-                resumo["Tipo"] = "NFC-e"
-            elif '<mod>57</mod>' in tag_l: 
-                resumo["Tipo"] = "CT-e"
-            
-            resumo["Série"] = re.search(r'<serie>(\d+)</', tag_l).group(1) if re.search(r'<serie>(\d+)</', tag_l) else "0"
-            ini = re.search(r'<nnfini>(\d+)</', tag_l).group(1) if re.search(r'<nnfini>(\d+)</', tag_l) else "0"
-            fin = re.search(r'<nnffin>(\d+)</', tag_l).group(1) if re.search(r'<nnffin>(\d+)</', tag_l) else ini
-            
-            resumo["Número"] = int(ini)
-            resumo["Range"] = (int(ini), int(fin))
-            
-            if resumo["Ano"] == "0000":
-                ano_match = re.search(r'<ano>(\d+)</', tag_l)
-                if ano_match: 
-                    resumo["Ano"] = "20" + ano_match.group(1)[-2:]
-                    
-            resumo["Chave"] = f"INUT_{resumo['Série']}_{ini}"
-
-        else:
-            match_ch = re.search(r'<(?:chnfe|chcte|chmdfe)>(\d{44})</', tag_l)
-            if not match_ch:
-                match_ch = re.search(r'id=["\'](?:nfe|cte|mdfe)?(\d{44})["\']', tag_l)
-                if match_ch:
-                    resumo["Chave"] = match_ch.group(1)
-                else:
-                    resumo["Chave"] = ""
-            else:
-                resumo["Chave"] = match_ch.group(1)
-
-            if resumo["Chave"] and len(resumo["Chave"]) == 44:
-                resumo["Ano"] = "20" + resumo["Chave"][2:4]
-                resumo["Mes"] = resumo["Chave"][4:6]
-                resumo["Série"] = str(int(resumo["Chave"][22:25]))
-                resumo["Número"] = int(resumo["Chave"][25:34])
-                
-                if not resumo["Data_Emissao"]: 
-                    resumo["Data_Emissao"] = f"{resumo['Ano']}-{resumo['Mes']}-01"
-
-            tipo = "NF-e"
-            if '<mod>65</mod>' in tag_l: 
-                tipo = "NFC-e"
-            elif '<mod>57</mod>' in tag_l or '<infcte' in tag_l: 
-                tipo = "CT-e"
-            elif '<mod>58</mod>' in tag_l or '<infmdfe' in tag_l: 
-                tipo = "MDF-e"
-            
-            status = "NORMAIS"
-            if '110111' in tag_l or '<cstat>101</cstat>' in tag_l: 
-                status = "CANCELADOS"
-            elif '110110' in tag_l: 
-                status = "CARTA_CORRECAO"
-                
-            resumo["Tipo"] = tipo
-            resumo["Status"] = status
-
-            if status == "NORMAIS":
-                v_match = re.search(r'<(?:vnf|vtprest|vreceb)>([\d.]+)</', tag_l)
-                if v_match:
-                    resumo["Valor"] = float(v_match.group(1))
-                else:
-                    resumo["Valor"] = 0.0
-            
-        if not resumo["CNPJ_Emit"] and resumo["Chave"] and not resumo["Chave"].startswith("INUT_"): 
-            resumo["CNPJ_Emit"] = resumo["Chave"][6:20]
-        
-        if resumo["Mes"] == "00": 
-            resumo["Mes"] = "01"
-            
-        if resumo["Ano"] == "0000": 
-            resumo["Ano"] = "2000"
-
-        is_p = (resumo["CNPJ_Emit"] == client_cnpj_clean)
-        
-        if is_p:
-            resumo["Pasta"] = f"EMITIDOS_CLIENTE/{resumo['Operacao']}/{resumo['Tipo']}/{resumo['Status']}/{resumo['Ano']}/{resumo['Mes']}/Serie_{resumo['Série']}"
-        else:
-            resumo["Pasta"] = f"RECEBIDOS_TERCEIROS/{resumo['Operacao']}/{resumo['Tipo']}/{resumo['Ano']}/{resumo['Mes']}"
-            
-        return resumo, is_p
-        
-    except Exception as e: 
-        return None, False
-
-# --- FUNÇÃO RECURSIVA OTIMIZADA PARA DISCO ---
-def extrair_recursivo(conteudo_ou_file, nome_arquivo):
-    if not os.path.exists(TEMP_EXTRACT_DIR): 
-        os.makedirs(TEMP_EXTRACT_DIR)
-        
-    if nome_arquivo.lower().endswith('.zip'):
-        try:
-            if hasattr(conteudo_ou_file, 'read'):
-                file_obj = conteudo_ou_file
-            else:
-                file_obj = io.BytesIO(conteudo_ou_file)
-                
-            with zipfile.ZipFile(file_obj) as z:
-                for sub_nome in z.namelist():
-                    if sub_nome.startswith('__MACOSX') or os.path.basename(sub_nome).startswith('.'): 
-                        continue
-                        
-                    if sub_nome.lower().endswith('.zip'):
-                        temp_path = z.extract(sub_nome, path=TEMP_EXTRACT_DIR)
-                        with open(temp_path, 'rb') as f_temp:
-                            yield from extrair_recursivo(f_temp, sub_nome)
-                        try: 
-                            os.remove(temp_path)
-                        except: 
-                            pass
-                    elif sub_nome.lower().endswith('.xml'):
-                        yield (os.path.basename(sub_nome), z.read(sub_nome))
-        except: 
-            pass
-            
-    elif nome_arquivo.lower().endswith('.xml'):
-        if hasattr(conteudo_ou_file, 'read'): 
-            yield (os.path.basename(nome_arquivo), conteudo_ou_file.read())
-        else: 
-            yield (os.path.basename(nome_arquivo), conteudo_ou_file)
+# --- RELATÓRIO FINAL (GRAVADO EM DISCO) ---
+PREFIXO_RELATORIO = "relatorio_garimpeiro"
+FORMATOS_RELATORIO = {"Excel (.xlsx)": ".xlsx", "CSV (;)": ".csv", "Parquet": ".parquet"}
 
 # --- LIMPEZA DE PASTAS TEMPORÁRIAS ---
 def limpar_arquivos_temp():
@@ -286,34 +131,37 @@ def limpar_arquivos_temp():
             if f.endswith('.zip') and ('z_org_final' in f or 'z_todos_final' in f or 'faltantes_dominio_final' in f):
                 try: os.remove(f)
                 except: pass
+            elif f.startswith(PREFIXO_RELATORIO):
+                try: os.remove(f)
+                except: pass
             
         if os.path.exists(TEMP_EXTRACT_DIR): 
             shutil.rmtree(TEMP_EXTRACT_DIR, ignore_errors=True)
             
         if os.path.exists(TEMP_UPLOADS_DIR): 
             shutil.rmtree(TEMP_UPLOADS_DIR, ignore_errors=True)
+            
+        if os.path.exists(INDICE_DB): 
+            os.remove(INDICE_DB)
     except: 
         pass
 
-# --- DIVISOR DE LOTES HTML (Para deixar botões organizados) ---
-def chunk_list(lst, n):
-    for i in range(0, len(lst), n): 
-        yield lst[i:i + n]
-
-# --- FUNÇÃO AUXILIAR PARA O BLOCO DOMÍNIO ---
-def extrair_notas_faltantes_dominio(pdf_file):
-    notas_faltantes = []
-    try:
-        with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                matches = re.findall(r'(\d+)\s+(\d+)\s+(\d+)\s+(?:NFe|NFCe|CTe|NF-e|NFC-e|CT-e)', text, re.IGNORECASE)
-                for m in matches:
-                    inicio, fim, serie = int(m[0]), int(m[1]), str(m[2])
-                    for num in range(inicio, fim + 1):
-                        notas_faltantes.append({"Série": serie, "Número": num})
-    except: pass
-    return notas_faltantes
+# --- PUBLICA AS TABELAS DO MOTOR DE AUDITORIA NA SESSÃO ---
+def publicar_auditoria():
+    # Só as séries alteradas desde a última publicação são recalculadas
+    st.session_state.update(st.session_state['auditoria'].tabelas())
+
+# --- DOWNLOAD DAS PARTES (DIRETO DO DISCO, UMA DE CADA VEZ) ---
+def botao_download_partes(partes, chave):
+    # Só a parte escolhida é aberta no rerun; as demais não passam pela RAM
+    rotulos = {f"LOTE {i} ({os.path.getsize(p) / 2**20:.1f} MB)": p for i, p in enumerate(partes, 1) if os.path.exists(p)}
+    if not rotulos:
+        return
+    c_sel, c_btn = st.columns([2, 1])
+    escolha = c_sel.selectbox("Parte:", list(rotulos), key=f"sel_{chave}", label_visibility="collapsed")
+    with open(rotulos[escolha], 'rb') as f:
+        c_btn.download_button("📥 BAIXAR", f, os.path.basename(rotulos[escolha]), mime="application/zip",
+                              key=f"dl_{chave}", use_container_width=True)
 
 # --- INTERFACE ---
 st.markdown("<h1>⛏️ O GARIMPEIRO</h1>", unsafe_allow_html=True)
@@ -351,29 +199,34 @@ st.markdown("---")
 keys_to_init = [
     'garimpo_ok', 
     'confirmado', 
-    'relatorio', 
+    'auditoria', 
     'df_resumo', 
     'df_faltantes', 
+    'df_faixas_suspeitas', 
     'df_canceladas', 
     'df_inutilizadas', 
-    'df_autorizadas', 
-    'df_geral', 
     'df_divergencias', 
     'st_counts', 
     'validation_done', 
     'export_ready',
     'org_zip_parts',
     'todos_zip_parts',
+    'relatorios',
     'ch_falt_dom',
-    'zip_dom_pronto'
+    'zip_dom_pronto',
+    'uploads_salvos'
 ]
 
 for k in keys_to_init:
     if k not in st.session_state:
         if 'df' in k: 
             st.session_state[k] = pd.DataFrame()
-        elif k in ['relatorio', 'org_zip_parts', 'todos_zip_parts', 'ch_falt_dom']: 
+        elif k in ['org_zip_parts', 'todos_zip_parts', 'relatorios', 'ch_falt_dom']: 
             st.session_state[k] = []
+        elif k == 'auditoria': 
+            st.session_state[k] = MotorAuditoria()
+        elif k == 'uploads_salvos': 
+            st.session_state[k] = {}
         elif k == 'st_counts': 
             st.session_state[k] = {"CANCELADOS": 0, "INUTILIZADOS": 0, "AUTORIZADAS": 0}
         else: 
@@ -381,7 +234,7 @@ for k in keys_to_init:
 
 with st.sidebar:
     st.markdown("### 🔍 Configuração")
-    cnpj_input = st.text_input("CNPJ DO CLIENTE", placeholder="00.000.000/0001-00")
+    cnpj_input = st.text_input("CNPJ DO CLIENTE", value=st.session_state.get('cnpj_sessao', ""), placeholder="00.000.000/0001-00")
     cnpj_limpo = "".join(filter(str.isdigit, cnpj_input))
     
     if cnpj_input and len(cnpj_limpo) != 14: 
@@ -391,6 +244,26 @@ with st.sidebar:
         if st.button("✅ LIBERAR OPERAÇÃO"): 
             st.session_state['confirmado'] = True
             
+    workers_garimpo = st.number_input(
+        "NÚCLEOS DE PROCESSAMENTO", 
+        min_value=1, 
+        max_value=max(os.cpu_count() or 1, WORKERS_PADRAO), 
+        value=WORKERS_PADRAO, 
+        help="Quantidade de processos usados em paralelo no garimpo, na exportação e na leitura do PDF da Domínio."
+    )
+    
+    try:
+        # Só leitura: não cria o banco nem disputa a escrita com um garimpo
+        cache_leitura = CacheResumos(somente_leitura=True)
+        stats_cache = cache_leitura.estatisticas()
+        cache_leitura.fechar()
+        st.caption(
+            f"♻️ Cache de leitura: {stats_cache['entradas']:,} XMLs · "
+            f"{stats_cache['taxa_acerto']:.0%} de acertos ({stats_cache['acertos']:,} / {stats_cache['acertos'] + stats_cache['falhas']:,})"
+        )
+    except Exception:
+        pass
+            
     st.divider()
     
     if st.button("🗑️ RESETAR SISTEMA"):
@@ -398,6 +271,43 @@ with st.sidebar:
         st.session_state.clear()
         st.rerun()
 
+    # --- SESSÕES SALVAS (SOBREVIVEM A TIMEOUT, REDEPLOY E AO RESET) ---
+    st.divider()
+    st.markdown("### 💾 Sessões")
+    if st.session_state['garimpo_ok'] and st.button("💾 SALVAR SESSÃO"):
+        with st.spinner("Salvando sessão..."):
+            nome_sessao = f"{cnpj_limpo or 'sem_cnpj'}_{pd.Timestamp.now():%Y%m%d_%H%M%S}"
+            salvar_sessao(st.session_state['auditoria'], nome_sessao, {
+                "cnpj": cnpj_limpo,
+                "uploads_salvos": st.session_state['uploads_salvos'],
+                "validation_done": bool(st.session_state['validation_done'])
+            })
+        st.success(f"Sessão {nome_sessao} salva.")
+
+    sessoes = {f"{m['nome']} · {m['documentos']:,} docs": m['nome'] for m in listar_sessoes()}
+    if sessoes:
+        escolha_sessao = st.selectbox("Sessão salva:", list(sessoes))
+        c_rest, c_apagar = st.columns(2)
+        if c_rest.button("♻️ RESTAURAR", use_container_width=True):
+            with st.spinner("Restaurando sessão..."):
+                limpar_arquivos_temp()
+                st.session_state.clear()
+                motor, manifesto = restaurar_sessao(sessoes[escolha_sessao])
+            estado = manifesto["estado"]
+            st.session_state.update({
+                'auditoria': motor,
+                'cnpj_sessao': estado.get("cnpj", ""),
+                'uploads_salvos': estado.get("uploads_salvos", {}),
+                'validation_done': estado.get("validation_done", False),
+                'confirmado': True,
+                'garimpo_ok': True
+            })
+            publicar_auditoria()
+            st.rerun()
+        if c_apagar.button("🗑️ APAGAR", use_container_width=True):
+            apagar_sessao(sessoes[escolha_sessao])
+            st.rerun()
+
 if st.session_state['confirmado']:
     if not st.session_state['garimpo_ok']:
         uploaded_files = st.file_uploader("📂 ARQUIVOS XML/ZIP (Suporta grandes volumes):", accept_multiple_files=True)
@@ -405,151 +315,52 @@ if st.session_state['confirmado']:
             limpar_arquivos_temp() 
             os.makedirs(TEMP_UPLOADS_DIR, exist_ok=True)
             
-            lote_dict = {}
             progresso_bar = st.progress(0)
             status_text = st.empty()
             total_arquivos = len(uploaded_files)
             
             with st.status("⛏️ Minerando e salvando fisicamente...", expanded=True) as status_box:
                 
-                # 1. Salva uploads fisicamente no disco para evitar estouro de RAM
-                for i, f in enumerate(uploaded_files):
-                    caminho_salvo = os.path.join(TEMP_UPLOADS_DIR, f.name)
-                    with open(caminho_salvo, "wb") as out_f:
-                        out_f.write(f.read())
+                # 1. Salva uploads fisicamente no disco, em blocos, para evitar estouro de RAM
+                # (arquivos diferentes com o mesmo nome ganham prefixo, sem sobrescrever)
+                digests = st.session_state['uploads_salvos'] = {}
+                for f in uploaded_files:
+                    if salvar_upload(f, digests, nome=nome_disponivel(f.name, digests)) is None:
+                        st.write(f"♻️ {f.name}: conteúdo idêntico a outro arquivo enviado, ignorado.")
                 
-                # 2. Lê do disco e monta as tabelas em tempo real
-                lista_salvos = os.listdir(TEMP_UPLOADS_DIR)
-                total_salvos = len(lista_salvos)
+                # 2. Lê do disco e monta as tabelas (em paralelo, um processo por núcleo)
+                lista_salvos = [os.path.join(TEMP_UPLOADS_DIR, f_name) for f_name in os.listdir(TEMP_UPLOADS_DIR)]
                 
-                for i, f_name in enumerate(lista_salvos):
-                    if i % 50 == 0: 
-                        gc.collect()
-                        
-                    progresso_bar.progress((i + 1) / total_salvos)
+                def _progresso(feitas, total, f_name):
+                    progresso_bar.progress(feitas / total)
                     status_text.text(f"⛏️ Lendo conteúdo: {f_name}")
-                    
-                    caminho_leitura = os.path.join(TEMP_UPLOADS_DIR, f_name)
-                    try:
-                        with open(caminho_leitura, "rb") as file_obj:
-                            todos_xmls = extrair_recursivo(file_obj, f_name)
-                            for name, xml_data in todos_xmls:
-                                res, is_p = identify_xml_info(xml_data, cnpj_limpo, name)
-                                if res:
-                                    key = res["Chave"]
-                                    if key in lote_dict:
-                                        if res["Status"] in ["CANCELADOS", "INUTILIZADOS"]: 
-                                            lote_dict[key] = (res, is_p)
-                                    else:
-                                        lote_dict[key] = (res, is_p)
-                                del xml_data 
-                    except Exception as e: 
-                        continue
+                
+                # 3. Cada XML encontrado vai para o índice físico (chave -> local no disco);
+                #    XMLs já lidos em garimpos anteriores saem do cache de leitura
+                conn_indice = abrir_indice(recriar=True)
+                cache_leitura = CacheResumos()
+                try:
+                    lote_dict = garimpar_lote(
+                        lista_salvos, cnpj_limpo, workers=workers_garimpo, 
+                        ao_progredir=_progresso, 
+                        ao_registrar=lambda achados: registrar_documentos(conn_indice, achados), 
+                        cache=cache_leitura
+                    )
+                    conn_indice.commit()
+                    cache_leitura.salvar()
+                finally:
+                    conn_indice.close()
+                    cache_leitura.fechar()
                 
                 status_box.update(label="✅ Leitura Concluída!", state="complete", expanded=False)
                 progresso_bar.empty()
                 status_text.empty()
 
-            rel_list = []
-            audit_map = {}
-            canc_list = []
-            inut_list = []
-            aut_list = []
-            geral_list = []
-            
-            for k, (res, is_p) in lote_dict.items():
-                rel_list.append(res)
-                
-                if is_p:
-                    origem_label = f"EMISSÃO PRÓPRIA ({res['Operacao']})"
-                else:
-                    origem_label = f"TERCEIROS ({res['Operacao']})"
-                
-                registro_base = {
-                    "Origem": origem_label, 
-                    "Operação": res["Operacao"], 
-                    "Modelo": res["Tipo"], 
-                    "Série": res["Série"], 
-                    "Nota": res["Número"], 
-                    "Data Emissão": res["Data_Emissao"],
-                    "CNPJ Emitente": res["CNPJ_Emit"], 
-                    "Nome Emitente": res["Nome_Emit"],
-                    "Doc Destinatário": res["Doc_Dest"], 
-                    "Nome Destinatário": res["Nome_Dest"],
-                    "Chave": res["Chave"], 
-                    "Status Final": res["Status"], 
-                    "Valor": res["Valor"],
-                    "Ano": res["Ano"], 
-                    "Mes": res["Mes"]
-                }
-
-                if res["Status"] == "INUTILIZADOS":
-                    r = res.get("Range", (res["Número"], res["Número"]))
-                    for n in range(r[0], r[1] + 1):
-                        item_inut = registro_base.copy()
-                        item_inut.update({"Nota": n, "Status Final": "INUTILIZADA", "Valor": 0.0})
-                        geral_list.append(item_inut)
-                else:
-                    geral_list.append(registro_base)
-
-                if is_p:
-                    sk = (res["Tipo"], res["Série"])
-                    
-                    if sk not in audit_map: 
-                        audit_map[sk] = {"nums": set(), "valor": 0.0}
-                        
-                    if res["Status"] == "INUTILIZADOS":
-                        r = res.get("Range", (res["Número"], res["Número"]))
-                        for n in range(r[0], r[1] + 1):
-                            audit_map[sk]["nums"].add(n)
-                            inut_list.append({"Modelo": res["Tipo"], "Série": res["Série"], "Nota": n})
-                    else:
-                        if res["Número"] > 0:
-                            audit_map[sk]["nums"].add(res["Número"])
-                            
-                            if res["Status"] == "CANCELADOS":
-                                canc_list.append(registro_base)
-                            elif res["Status"] == "NORMAIS":
-                                aut_list.append(registro_base)
-                                
-                            audit_map[sk]["valor"] += res["Valor"]
-
-            res_final = []
-            fal_final = []
-            
-            for (t, s), dados in audit_map.items():
-                ns = sorted(list(dados["nums"]))
-                if ns:
-                    n_min = ns[0]
-                    n_max = ns[-1]
-                    res_final.append({
-                        "Documento": t, 
-                        "Série": s, 
-                        "Início": n_min, 
-                        "Fim": n_max, 
-                        "Quantidade": len(ns), 
-                        "Valor Contábil (R$)": round(dados["valor"], 2)
-                    })
-                    
-                    for b in sorted(list(set(range(n_min, n_max + 1)) - set(ns))):
-                        fal_final.append({"Tipo": t, "Série": s, "Nº Faltante": b})
-
-            st.session_state.update({
-                'relatorio': rel_list,
-                'df_resumo': pd.DataFrame(res_final), 
-                'df_faltantes': pd.DataFrame(fal_final), 
-                'df_canceladas': pd.DataFrame(canc_list), 
-                'df_inutilizadas': pd.DataFrame(inut_list), 
-                'df_autorizadas': pd.DataFrame(aut_list), 
-                'df_geral': pd.DataFrame(geral_list),
-                'st_counts': {
-                    "CANCELADOS": len(canc_list), 
-                    "INUTILIZADOS": len(inut_list), 
-                    "AUTORIZADAS": len(aut_list)
-                }, 
-                'garimpo_ok': True, 
-                'export_ready': False
-            })
+            motor = MotorAuditoria()
+            motor.carregar(lote_dict)
+            st.session_state['auditoria'] = motor
+            publicar_auditoria()
+            st.session_state.update({'garimpo_ok': True, 'export_ready': False})
             st.rerun()
     else:
         # --- RESULTADOS TELA INICIAL ---
@@ -570,8 +381,11 @@ if st.session_state['confirmado']:
             st.markdown(f"### ⚠️ BURACOS ({qtd_buracos})")
             if not st.session_state['df_faltantes'].empty:
                 st.dataframe(st.session_state['df_faltantes'], use_container_width=True, hide_index=True)
-            else: 
+            elif st.session_state['df_faixas_suspeitas'].empty: 
                 st.info("✅ Tudo em ordem.")
+            if not st.session_state['df_faixas_suspeitas'].empty:
+                st.warning("🚨 Faixas faltantes não listadas nota a nota (grandes demais, provável numeração inválida, ou além do limite de linhas da tabela):")
+                st.dataframe(st.session_state['df_faixas_suspeitas'], use_container_width=True, hide_index=True)
                 
         with col_canc:
             st.markdown("### ❌ CANCELADAS")
@@ -611,7 +425,7 @@ if st.session_state['confirmado']:
                                 nota_man = int(partes[2].replace("Nota", "").strip())
                                 
                                 res_manual = {
-                                    "Arquivo": "REGISTRO_MANUAL", 
+                                    "Arquivo": ARQUIVO_MANUAL, 
                                     "Chave": f"MANUAL_INUT_{tipo_man}_{serie_man}_{nota_man}",
                                     "Tipo": tipo_man, 
                                     "Série": serie_man, 
@@ -629,114 +443,15 @@ if st.session_state['confirmado']:
                                     "Doc_Dest": "", 
                                     "Nome_Dest": ""
                                 }
-                                st.session_state['relatorio'].append(res_manual)
+                                st.session_state['auditoria'].adicionar(res_manual, True)
                         
-                            lote_recalc = {}
-                            for item in st.session_state['relatorio']:
-                                key = item["Chave"]
-                                is_p = "EMITIDOS_CLIENTE" in item["Pasta"]
-                                if key in lote_recalc:
-                                    if item["Status"] in ["CANCELADOS", "INUTILIZADOS"]: 
-                                        lote_recalc[key] = (item, is_p)
-                                else: 
-                                    lote_recalc[key] = (item, is_p)
-
-                            audit_map = {}
-                            canc_list = []
-                            inut_list = []
-                            aut_list = []
-                            geral_list = []
-                            
-                            for k, (res, is_p) in lote_recalc.items():
-                                if is_p:
-                                    origem_label = f"EMISSÃO PRÓPRIA ({res['Operacao']})"
-                                else:
-                                    origem_label = f"TERCEIROS ({res['Operacao']})"
-                                    
-                                registro_detalhado = {
-                                    "Origem": origem_label, 
-                                    "Operação": res["Operacao"], 
-                                    "Modelo": res["Tipo"], 
-                                    "Série": res["Série"], 
-                                    "Nota": res["Número"], 
-                                    "Data Emissão": res["Data_Emissao"], 
-                                    "CNPJ Emitente": res["CNPJ_Emit"], 
-                                    "Nome Emitente": res["Nome_Emit"],
-                                    "Doc Destinatário": res["Doc_Dest"], 
-                                    "Nome Destinatário": res["Nome_Dest"], 
-                                    "Chave": res["Chave"], 
-                                    "Status Final": res["Status"], 
-                                    "Valor": res["Valor"], 
-                                    "Ano": res["Ano"], 
-                                    "Mes": res["Mes"]
-                                }
-                                
-                                if res["Status"] == "INUTILIZADOS":
-                                    r = res.get("Range", (res["Número"], res["Número"]))
-                                    for n in range(r[0], r[1] + 1):
-                                        item_inut = registro_detalhado.copy()
-                                        item_inut.update({"Nota": n, "Status Final": "INUTILIZADA", "Valor": 0.0})
-                                        geral_list.append(item_inut)
-                                else: 
-                                    geral_list.append(registro_detalhado)
-
-                                if is_p:
-                                    sk = (res["Tipo"], res["Série"])
-                                    if sk not in audit_map: 
-                                        audit_map[sk] = {"nums": set(), "valor": 0.0}
-                                        
-                                    if res["Status"] == "INUTILIZADOS":
-                                        r = res.get("Range", (res["Número"], res["Número"]))
-                                        for n in range(r[0], r[1] + 1):
-                                            audit_map[sk]["nums"].add(n)
-                                            inut_list.append({"Modelo": res["Tipo"], "Série": res["Série"], "Nota": n})
-                                    else:
-                                        if res["Número"] > 0:
-                                            audit_map[sk]["nums"].add(res["Número"])
-                                            if res["Status"] == "CANCELADOS": 
-                                                canc_list.append(registro_detalhado)
-                                            elif res["Status"] == "NORMAIS": 
-                                                aut_list.append(registro_detalhado)
-                                            audit_map[sk]["valor"] += res["Valor"]
-
-                            res_final = []
-                            fal_final = []
-                            
-                            for (t, s), dados in audit_map.items():
-                                ns = sorted(list(dados["nums"]))
-                                if ns:
-                                    n_min = ns[0]
-                                    n_max = ns[-1]
-                                    res_final.append({
-                                        "Documento": t, 
-                                        "Série": s, 
-                                        "Início": n_min, 
-                                        "Fim": n_max, 
-                                        "Quantidade": len(ns), 
-                                        "Valor Contábil (R$)": round(dados["valor"], 2)
-                                    })
-                                    for b in sorted(list(set(range(n_min, n_max + 1)) - set(ns))): 
-                                        fal_final.append({"Tipo": t, "Série": s, "Nº Faltante": b})
-
-                            st.session_state.update({
-                                'df_resumo': pd.DataFrame(res_final), 
-                                'df_faltantes': pd.DataFrame(fal_final), 
-                                'df_canceladas': pd.DataFrame(canc_list), 
-                                'df_inutilizadas': pd.DataFrame(inut_list), 
-                                'df_autorizadas': pd.DataFrame(aut_list), 
-                                'df_geral': pd.DataFrame(geral_list), 
-                                'st_counts': {
-                                    "CANCELADOS": len(canc_list), 
-                                    "INUTILIZADOS": len(inut_list), 
-                                    "AUTORIZADAS": len(aut_list)
-                                }
-                            })
+                            publicar_auditoria()
                             st.rerun()
 
         # =====================================================================
         # MÓDULO: DESFAZER INUTILIZAÇÃO MANUAL
         # =====================================================================
-        inut_manuais = [item for item in st.session_state['relatorio'] if item.get('Arquivo') == "REGISTRO_MANUAL"]
+        inut_manuais = st.session_state['auditoria'].documentos_manuais()
         if inut_manuais:
             with st.expander("🔙 DESFAZER INUTILIZAÇÃO MANUAL"):
                 opcoes_desfazer = []
@@ -756,108 +471,9 @@ if st.session_state['confirmado']:
                                 t_nota = int(partes[2].replace('Nota', '').strip())
                                 chaves_removidas.append(f"MANUAL_INUT_{t_tipo}_{t_serie}_{t_nota}")
                                 
-                            st.session_state['relatorio'] = [i for i in st.session_state['relatorio'] if i['Chave'] not in chaves_removidas]
-                            
-                            lote_recalc = {}
-                            for item in st.session_state['relatorio']:
-                                key = item["Chave"]
-                                is_p = "EMITIDOS_CLIENTE" in item["Pasta"]
-                                if key in lote_recalc:
-                                    if item["Status"] in ["CANCELADOS", "INUTILIZADOS"]: 
-                                        lote_recalc[key] = (item, is_p)
-                                else: 
-                                    lote_recalc[key] = (item, is_p)
-
-                            audit_map = {}
-                            canc_list = []
-                            inut_list = []
-                            aut_list = []
-                            geral_list = []
-                            
-                            for k, (res, is_p) in lote_recalc.items():
-                                if is_p:
-                                    origem_label = f"EMISSÃO PRÓPRIA ({res['Operacao']})"
-                                else:
-                                    origem_label = f"TERCEIROS ({res['Operacao']})"
-                                    
-                                registro_detalhado = {
-                                    "Origem": origem_label, 
-                                    "Operação": res["Operacao"], 
-                                    "Modelo": res["Tipo"], 
-                                    "Série": res["Série"], 
-                                    "Nota": res["Número"], 
-                                    "Data Emissão": res["Data_Emissao"], 
-                                    "CNPJ Emitente": res["CNPJ_Emit"], 
-                                    "Nome Emitente": res["Nome_Emit"], 
-                                    "Doc Destinatário": res["Doc_Dest"], 
-                                    "Nome Destinatário": res["Nome_Dest"], 
-                                    "Chave": res["Chave"], 
-                                    "Status Final": res["Status"], 
-                                    "Valor": res["Valor"], 
-                                    "Ano": res["Ano"], 
-                                    "Mes": res["Mes"]
-                                }
-                                
-                                if res["Status"] == "INUTILIZADOS":
-                                    r = res.get("Range", (res["Número"], res["Número"]))
-                                    for n in range(r[0], r[1] + 1):
-                                        item_inut = registro_detalhado.copy()
-                                        item_inut.update({"Nota": n, "Status Final": "INUTILIZADA", "Valor": 0.0})
-                                        geral_list.append(item_inut)
-                                else: 
-                                    geral_list.append(registro_detalhado)
-
-                                if is_p:
-                                    sk = (res["Tipo"], res["Série"])
-                                    if sk not in audit_map: 
-                                        audit_map[sk] = {"nums": set(), "valor": 0.0}
-                                        
-                                    if res["Status"] == "INUTILIZADOS":
-                                        r = res.get("Range", (res["Número"], res["Número"]))
-                                        for n in range(r[0], r[1] + 1): 
-                                            audit_map[sk]["nums"].add(n)
-                                            inut_list.append({"Modelo": res["Tipo"], "Série": res["Série"], "Nota": n})
-                                    else:
-                                        if res["Número"] > 0:
-                                            audit_map[sk]["nums"].add(res["Número"])
-                                            if res["Status"] == "CANCELADOS": 
-                                                canc_list.append(registro_detalhado)
-                                            elif res["Status"] == "NORMAIS": 
-                                                aut_list.append(registro_detalhado)
-                                            audit_map[sk]["valor"] += res["Valor"]
-                                            
-                            res_final = []
-                            fal_final = []
-                            
-                            for (t, s), dados in audit_map.items():
-                                ns = sorted(list(dados["nums"]))
-                                if ns:
-                                    n_min = ns[0]
-                                    n_max = ns[-1]
-                                    res_final.append({
-                                        "Documento": t, 
-                                        "Série": s, 
-                                        "Início": n_min, 
-                                        "Fim": n_max, 
-                                        "Quantidade": len(ns), 
-                                        "Valor Contábil (R$)": round(dados["valor"], 2)
-                                    })
-                                    for b in sorted(list(set(range(n_min, n_max + 1)) - set(ns))): 
-                                        fal_final.append({"Tipo": t, "Série": s, "Nº Faltante": b})
-                                        
-                            st.session_state.update({
-                                'df_resumo': pd.DataFrame(res_final), 
-                                'df_faltantes': pd.DataFrame(fal_final), 
-                                'df_canceladas': pd.DataFrame(canc_list), 
-                                'df_inutilizadas': pd.DataFrame(inut_list), 
-                                'df_autorizadas': pd.DataFrame(aut_list), 
-                                'df_geral': pd.DataFrame(geral_list), 
-                                'st_counts': {
-                                    "CANCELADOS": len(canc_list), 
-                                    "INUTILIZADOS": len(inut_list), 
-                                    "AUTORIZADAS": len(aut_list)
-                                }
-                            })
+                            for chave in chaves_removidas:
+                                st.session_state['auditoria'].remover(chave)
+                            publicar_auditoria()
                             st.rerun()
 
         st.divider()
@@ -874,132 +490,13 @@ if st.session_state['confirmado']:
                 st.success("✅ O status dos XMLs está alinhado com a SEFAZ.")
 
         with st.expander("Clique aqui para subir o Excel e atualizar o status real"):
-            auth_file = st.file_uploader("Suba o Excel (.xlsx) [Col A=Chave, Col F=Status]", type=["xlsx", "xls"], key="auth_up")
+            auth_file = st.file_uploader("Suba o relatório (.xlsx ou .csv) [Col A=Chave, Col F=Status]", type=["xlsx", "xls", "csv"], key="auth_up")
             if auth_file and st.button("🔄 VALIDAR E ATUALIZAR"):
-                df_auth = pd.read_excel(auth_file)
-                auth_dict = {}
-                
-                for idx, row in df_auth.iterrows():
-                    chave_lida = str(row.iloc[0]).strip()
-                    status_lido = str(row.iloc[5]).strip().upper()
-                    if len(chave_lida) == 44:
-                        auth_dict[chave_lida] = status_lido
-                        
-                lote_recalc = {}
-                for item in st.session_state['relatorio']:
-                    key = item["Chave"]
-                    is_p = "EMITIDOS_CLIENTE" in item["Pasta"]
-                    if key in lote_recalc:
-                        if item["Status"] in ["CANCELADOS", "INUTILIZADOS"]: 
-                            lote_recalc[key] = (item, is_p)
-                    else: 
-                        lote_recalc[key] = (item, is_p)
-
-                audit_map = {}
-                canc_list = []
-                inut_list = []
-                aut_list = []
-                geral_list = []
-                div_list = []
-                
-                for k, (res, is_p) in lote_recalc.items():
-                    status_final = res["Status"]
-                    
-                    if res["Chave"] in auth_dict and "CANCEL" in auth_dict[res["Chave"]]:
-                        status_final = "CANCELADOS"
-                        if res["Status"] == "NORMAIS": 
-                            div_list.append({
-                                "Chave": res["Chave"], 
-                                "Nota": res["Número"], 
-                                "Status XML": "AUTORIZADA", 
-                                "Status Real": "CANCELADA"
-                            })
-                    
-                    if is_p:
-                        origem_label = f"EMISSÃO PRÓPRIA ({res['Operacao']})"
-                    else:
-                        origem_label = f"TERCEIROS ({res['Operacao']})"
-                        
-                    registro_detalhado = {
-                        "Origem": origem_label, 
-                        "Operação": res["Operacao"], 
-                        "Modelo": res["Tipo"], 
-                        "Série": res["Série"], 
-                        "Nota": res["Número"], 
-                        "Data Emissão": res["Data_Emissao"], 
-                        "CNPJ Emitente": res["CNPJ_Emit"], 
-                        "Nome Emitente": res["Nome_Emit"], 
-                        "Doc Destinatário": res["Doc_Dest"], 
-                        "Nome Destinatário": res["Nome_Dest"], 
-                        "Chave": res["Chave"], 
-                        "Status Final": status_final, 
-                        "Valor": res["Valor"], 
-                        "Ano": res["Ano"], 
-                        "Mes": res["Mes"]
-                    }
-                    
-                    if status_final == "INUTILIZADOS":
-                        r = res.get("Range", (res["Número"], res["Número"]))
-                        for n in range(r[0], r[1] + 1):
-                            item_inut = registro_detalhado.copy()
-                            item_inut.update({"Nota": n, "Status Final": "INUTILIZADA", "Valor": 0.0})
-                            geral_list.append(item_inut)
-                    else: 
-                        geral_list.append(registro_detalhado)
-
-                    if is_p:
-                        sk = (res["Tipo"], res["Série"])
-                        if sk not in audit_map: 
-                            audit_map[sk] = {"nums": set(), "valor": 0.0}
-                            
-                        if status_final == "INUTILIZADOS":
-                            r = res.get("Range", (res["Número"], res["Número"]))
-                            for n in range(r[0], r[1] + 1): 
-                                audit_map[sk]["nums"].add(n)
-                                inut_list.append({"Modelo": res["Tipo"], "Série": res["Série"], "Nota": n})
-                        else:
-                            if res["Número"] > 0:
-                                audit_map[sk]["nums"].add(res["Número"])
-                                if status_final == "CANCELADOS": 
-                                    canc_list.append(registro_detalhado)
-                                elif status_final == "NORMAIS": 
-                                    aut_list.append(registro_detalhado)
-                                audit_map[sk]["valor"] += res["Valor"]
-                                
-                res_final = []
-                fal_final = []
-                
-                for (t, s), dados in audit_map.items():
-                    ns = sorted(list(dados["nums"]))
-                    if ns:
-                        n_min = ns[0]
-                        n_max = ns[-1]
-                        res_final.append({
-                            "Documento": t, 
-                            "Série": s, 
-                            "Início": n_min, 
-                            "Fim": n_max, 
-                            "Quantidade": len(ns), 
-                            "Valor Contábil (R$)": round(dados["valor"], 2)
-                        })
-                        for b in sorted(list(set(range(n_min, n_max + 1)) - set(ns))): 
-                            fal_final.append({"Tipo": t, "Série": s, "Nº Faltante": b})
-                            
-                st.session_state.update({
-                    'df_canceladas': pd.DataFrame(canc_list), 
-                    'df_autorizadas': pd.DataFrame(aut_list), 
-                    'df_inutilizadas': pd.DataFrame(inut_list), 
-                    'df_geral': pd.DataFrame(geral_list), 
-                    'df_resumo': pd.DataFrame(res_final), 
-                    'df_faltantes': pd.DataFrame(fal_final), 
-                    'df_divergencias': pd.DataFrame(div_list), 
-                    'st_counts': {
-                        "CANCELADOS": len(canc_list), 
-                        "INUTILIZADOS": len(inut_list), 
-                        "AUTORIZADAS": len(aut_list)
-                    }, 
-                    'validation_done': True
-                })
+                # Leitura em blocos + um único cruzamento por Chave no motor
+                relatorio_auth = ler_relatorio_autenticidade(auth_file)
+                st.session_state['auditoria'].aplicar_autenticidade(relatorio_auth)
+                publicar_auditoria()
+                st.session_state['validation_done'] = True
                 st.rerun()
 
         st.divider()
@@ -1012,126 +509,35 @@ if st.session_state['confirmado']:
             if extra_files and st.button("PROCESSAR E ATUALIZAR LISTA"):
                 with st.spinner("Adicionando..."):
                     os.makedirs(TEMP_UPLOADS_DIR, exist_ok=True)
+                    conn_indice = abrir_indice()
+                    cache_leitura = CacheResumos()
                     for f in extra_files:
-                        caminho_salvo = os.path.join(TEMP_UPLOADS_DIR, f.name)
-                        with open(caminho_salvo, "wb") as out_f:
-                            out_f.write(f.read())
+                        # Arquivo byte a byte igual a um já garimpado não é lido de novo.
+                        # Um upload com o mesmo nome de outro (conteúdo diferente) é gravado
+                        # com prefixo: o anterior continua no disco, no índice e no motor
+                        digests = st.session_state['uploads_salvos']
+                        caminho_salvo = salvar_upload(f, digests, nome=nome_disponivel(f.name, digests))
+                        if caminho_salvo is None:
+                            continue
                         
-                        f.seek(0)
+                        achados = []
                         try:
-                            todos_xmls = extrair_recursivo(f, f.name)
-                            for name, xml_data in todos_xmls:
-                                res, is_p = identify_xml_info(xml_data, cnpj_limpo, name)
-                                if res:
-                                    ja_existe = any(item['Chave'] == res['Chave'] for item in st.session_state['relatorio'])
-                                    if not ja_existe:
-                                        st.session_state['relatorio'].append(res)
-                                del xml_data
+                            for res, is_p, local in ler_upload(caminho_salvo, cnpj_limpo, cache=cache_leitura):
+                                achados.append((res, is_p, local))
+                                # Mesma precedência do garimpo inicial: chave nova entra,
+                                # chave já no lote só é trocada por cancelamento/inutilização
+                                st.session_state['auditoria'].adicionar(res, is_p)
                         except: 
                             pass
+                        registrar_documentos(conn_indice, achados)
+                    conn_indice.commit()
+                    conn_indice.close()
+                    cache_leitura.salvar()
+                    cache_leitura.fechar()
                     
                     st.session_state['export_ready'] = False
                     
-                    lote_recalc = {}
-                    for item in st.session_state['relatorio']:
-                        key = item["Chave"]
-                        is_p = "EMITIDOS_CLIENTE" in item["Pasta"]
-                        if key in lote_recalc:
-                            if item["Status"] in ["CANCELADOS", "INUTILIZADOS"]: 
-                                lote_recalc[key] = (item, is_p)
-                        else: 
-                            lote_recalc[key] = (item, is_p)
-
-                    audit_map = {}
-                    canc_list = []
-                    inut_list = []
-                    aut_list = []
-                    geral_list = []
-                    
-                    for k, (res, is_p) in lote_recalc.items():
-                        if is_p:
-                            origem_label = f"EMISSÃO PRÓPRIA ({res['Operacao']})"
-                        else:
-                            origem_label = f"TERCEIROS ({res['Operacao']})"
-                            
-                        registro_detalhado = {
-                            "Origem": origem_label, 
-                            "Operação": res["Operacao"], 
-                            "Modelo": res["Tipo"], 
-                            "Série": res["Série"], 
-                            "Nota": res["Número"], 
-                            "Data Emissão": res["Data_Emissao"], 
-                            "CNPJ Emitente": res["CNPJ_Emit"], 
-                            "Nome Emitente": res["Nome_Emit"],
-                            "Doc Destinatário": res["Doc_Dest"], 
-                            "Nome Destinatário": res["Nome_Dest"], 
-                            "Chave": res["Chave"], 
-                            "Status Final": res["Status"], 
-                            "Valor": res["Valor"], 
-                            "Ano": res["Ano"], 
-                            "Mes": res["Mes"]
-                        }
-                        
-                        if res["Status"] == "INUTILIZADOS":
-                            r = res.get("Range", (res["Número"], res["Número"]))
-                            for n in range(r[0], r[1] + 1):
-                                item_inut = registro_detalhado.copy()
-                                item_inut.update({"Nota": n, "Status Final": "INUTILIZADA", "Valor": 0.0})
-                                geral_list.append(item_inut)
-                        else: 
-                            geral_list.append(registro_detalhado)
-
-                        if is_p:
-                            sk = (res["Tipo"], res["Série"])
-                            if sk not in audit_map: 
-                                audit_map[sk] = {"nums": set(), "valor": 0.0}
-                                
-                            if res["Status"] == "INUTILIZADOS":
-                                r = res.get("Range", (res["Número"], res["Número"]))
-                                for n in range(r[0], r[1] + 1): 
-                                    audit_map[sk]["nums"].add(n)
-                                    inut_list.append({"Modelo": res["Tipo"], "Série": res["Série"], "Nota": n})
-                            else:
-                                if res["Número"] > 0:
-                                    audit_map[sk]["nums"].add(res["Número"])
-                                    if res["Status"] == "CANCELADOS": 
-                                        canc_list.append(registro_detalhado)
-                                    elif res["Status"] == "NORMAIS": 
-                                        aut_list.append(registro_detalhado)
-                                    audit_map[sk]["valor"] += res["Valor"]
-                                    
-                    res_final = []
-                    fal_final = []
-                    
-                    for (t, s), dados in audit_map.items():
-                        ns = sorted(list(dados["nums"]))
-                        if ns:
-                            n_min = ns[0]
-                            n_max = ns[-1]
-                            res_final.append({
-                                "Documento": t, 
-                                "Série": s, 
-                                "Início": n_min, 
-                                "Fim": n_max, 
-                                "Quantidade": len(ns), 
-                                "Valor Contábil (R$)": round(dados["valor"], 2)
-                            })
-                            for b in sorted(list(set(range(n_min, n_max + 1)) - set(ns))): 
-                                fal_final.append({"Tipo": t, "Série": s, "Nº Faltante": b})
-                                
-                    st.session_state.update({
-                        'df_resumo': pd.DataFrame(res_final), 
-                        'df_faltantes': pd.DataFrame(fal_final), 
-                        'df_canceladas': pd.DataFrame(canc_list), 
-                        'df_inutilizadas': pd.DataFrame(inut_list), 
-                        'df_autorizadas': pd.DataFrame(aut_list), 
-                        'df_geral': pd.DataFrame(geral_list), 
-                        'st_counts': {
-                            "CANCELADOS": len(canc_list), 
-                            "INUTILIZADOS": len(inut_list), 
-                            "AUTORIZADAS": len(aut_list)
-                        }
-                    })
+                    publicar_auditoria()
                     st.rerun()
 
         st.divider()
@@ -1141,119 +547,126 @@ if st.session_state['confirmado']:
         # =====================================================================
         st.markdown("### ⚙️ ETAPA 3: FILTROS AVANÇADOS E EXPORTAÇÃO")
         
+        # Valores e contagens vêm prontos do motor (atualizados a cada inclusão/remoção)
+        facetas = st.session_state['auditoria'].facetas()
         todas_origens = ["EMISSÃO PRÓPRIA", "TERCEIROS"]
-        anos_meses = sorted(list(set([f"{r.get('Ano', '0000')}/{r.get('Mes', '00')}" for r in st.session_state['relatorio'] if r.get('Ano', '0000') != '0000'])))
-        modelos = sorted(list(set([r.get('Tipo', '') for r in st.session_state['relatorio']])))
-        series = sorted(list(set([str(r.get('Série', '0')) for r in st.session_state['relatorio']])))
-        status_opcoes = sorted(list(set([r.get('Status', '') for r in st.session_state['relatorio']]))) 
+
+        def com_contagem(faceta):
+            return lambda valor: f"{valor} ({facetas[faceta].get(valor, 0)})"
         
         with st.container():
             f_col1, f_col2, f_col3, f_col4, f_col5 = st.columns(5)
             with f_col1:
-                filtro_origem = st.multiselect("📌 Origem:", todas_origens)
+                filtro_origem = st.multiselect("📌 Origem:", todas_origens, format_func=com_contagem('origens'))
             with f_col2:
-                filtro_meses = st.multiselect("📅 Ano/Mês:", anos_meses)
+                filtro_meses = st.multiselect("📅 Ano/Mês:", list(facetas['anos_meses']), format_func=com_contagem('anos_meses'))
                 aplicar_mes_so_na_propria = st.checkbox("Aplicar Mês APENAS na Emissão Própria?", value=True)
             with f_col3:
-                filtro_modelos = st.multiselect("📄 Modelo:", modelos)
+                filtro_modelos = st.multiselect("📄 Modelo:", list(facetas['modelos']), format_func=com_contagem('modelos'))
             with f_col4:
-                filtro_series = st.multiselect("🔢 Série:", series)
+                filtro_series = st.multiselect("🔢 Série:", list(facetas['series']), format_func=com_contagem('series'))
             with f_col5:
-                filtro_status = st.multiselect("✅ Status:", status_opcoes) 
+                filtro_status = st.multiselect("✅ Status:", list(facetas['status']), format_func=com_contagem('status'))
+
+        formato_relatorio = st.radio("📊 Formato do relatório:", list(FORMATOS_RELATORIO), horizontal=True,
+                                     help="Excel acima de ~1 milhão de linhas continua em abas extras; CSV e Parquet não têm limite.")
 
         if st.button("🚀 PROCESSAR E GERAR ARQUIVOS FINAIS"):
             
             with st.spinner("Buscando no HD e montando pacotes..."):
                 
-                # Limpa zips antigos
+                # Limpa zips e relatórios antigos
                 for f in os.listdir('.'):
-                    if f.startswith('z_org_final') or f.startswith('z_todos_final'):
+                    if f.startswith('z_org_final') or f.startswith('z_todos_final') or f.startswith(PREFIXO_RELATORIO):
                         try: os.remove(f)
                         except: pass
 
                 # --- 1. APLICA FILTROS NO EXCEL ---
-                df_geral_filtrado = st.session_state['df_geral'].copy()
-                
-                if not df_geral_filtrado.empty:
-                    if len(filtro_origem) > 0:
-                        df_geral_filtrado = df_geral_filtrado[df_geral_filtrado['Origem'].str.contains('|'.join([o.split()[0] for o in filtro_origem]))]
-                            
-                    if len(filtro_meses) > 0:
-                        df_geral_filtrado['Mes_Comp'] = df_geral_filtrado['Ano'] + "/" + df_geral_filtrado['Mes']
-                        if aplicar_mes_so_na_propria:
-                            df_geral_filtrado = df_geral_filtrado[(df_geral_filtrado['Mes_Comp'].isin(filtro_meses)) | (df_geral_filtrado['Origem'].str.contains('TERCEIROS'))]
-                        else:
-                            df_geral_filtrado = df_geral_filtrado[df_geral_filtrado['Mes_Comp'].isin(filtro_meses)]
-                            
-                    if len(filtro_modelos) > 0:
-                        df_geral_filtrado = df_geral_filtrado[df_geral_filtrado['Modelo'].isin(filtro_modelos)]
-                        
-                    if len(filtro_series) > 0:
-                        df_geral_filtrado = df_geral_filtrado[df_geral_filtrado['Série'].astype(str).isin(filtro_series)]
-
-                    if len(filtro_status) > 0: 
-                        df_geral_filtrado = df_geral_filtrado[df_geral_filtrado['Status Final'].isin(filtro_status)]
-
-                # Excel Master
-                buffer_excel = io.BytesIO()
-                with pd.ExcelWriter(buffer_excel, engine='xlsxwriter') as writer:
-                    df_geral_filtrado.to_excel(writer, sheet_name='Filtrado', index=False)
-                st.session_state['excel_buffer'] = buffer_excel.getvalue()
+                # Máscaras sobre os códigos das colunas do motor (sem copiar df_geral)
+                df_geral_filtrado = st.session_state['auditoria'].filtrar_geral(
+                    origens=filtro_origem, meses=filtro_meses, modelos=filtro_modelos,
+                    series=filtro_series, status=filtro_status,
+                    mes_so_na_propria=aplicar_mes_so_na_propria
+                )
+
+                # Relatório gravado direto no disco (Excel em constant_memory)
+                st.session_state['relatorios'] = gravar_relatorio(
+                    df_geral_filtrado, PREFIXO_RELATORIO + FORMATOS_RELATORIO[formato_relatorio],
+                    st.session_state['auditoria'].abas_relatorio()
+                )
 
                 # --- 2. FILTRAGEM FÍSICA PARA ZIP (Zero RAM) ---
-                org_parts, todos_parts, org_count, todos_count, curr_org_part, curr_todos_part = [], [], 0, 0, 1, 1
-                org_name, todos_name = f'z_org_final_pt{curr_org_part}.zip', f'z_todos_final_pt{curr_todos_part}.zip'
-                
-                z_org = zipfile.ZipFile(org_name, "w", zipfile.ZIP_DEFLATED)
-                z_todos = zipfile.ZipFile(todos_name, "w", zipfile.ZIP_DEFLATED)
-                org_parts.append(org_name); todos_parts.append(todos_name)
-                
+                # Só os documentos selecionados são lidos, direto do local gravado no índice,
+                # e os que vieram de ZIP são copiados sem descompactar/recompactar.
                 filtro_chaves = set(df_geral_filtrado['Chave'].tolist())
-
-                if os.path.exists(TEMP_UPLOADS_DIR):
-                    for f_name in os.listdir(TEMP_UPLOADS_DIR):
-                        f_path = os.path.join(TEMP_UPLOADS_DIR, f_name)
-                        with open(f_path, "rb") as f_temp:
-                            for name, xml_data in extrair_recursivo(f_temp, f_name):
-                                res, is_p = identify_xml_info(xml_data, cnpj_limpo, name)
-                                if res and res["Chave"] in filtro_chaves:
-                                    if org_count >= MAX_XML_PER_ZIP:
-                                        z_org.close(); curr_org_part += 1; org_name = f'z_org_final_pt{curr_org_part}.zip'
-                                        z_org = zipfile.ZipFile(org_name, "w", zipfile.ZIP_DEFLATED); org_parts.append(org_name); org_count = 0
-                                    if todos_count >= MAX_XML_PER_ZIP:
-                                        z_todos.close(); curr_todos_part += 1; todos_name = f'z_todos_final_pt{curr_todos_part}.zip'
-                                        z_todos = zipfile.ZipFile(todos_name, "w", zipfile.ZIP_DEFLATED); todos_parts.append(todos_name); todos_count = 0
-
-                                    z_org.writestr(f"{res['Pasta']}/{name}", xml_data)
-                                    z_todos.writestr(name, xml_data)
-                                    org_count += 1; todos_count += 1
-                                del xml_data
-                
-                z_org.close(); z_todos.close()
+                org_parts, todos_parts = exportar_pacotes(localizar_documentos(filtro_chaves), workers=workers_garimpo)
                 st.session_state.update({'org_zip_parts': org_parts, 'todos_zip_parts': todos_parts, 'export_ready': True})
                 st.rerun()
 
         if st.session_state.get('export_ready'):
             st.success("✅ Pacotes prontos!")
             st.markdown("### 📂 DOWNLOAD: ORGANIZADO")
-            for row in chunk_list(st.session_state['org_zip_parts'], 3):
-                cols = st.columns(len(row))
-                for idx, part in enumerate(row):
-                    with open(part, 'rb') as f:
-                        cols[idx].download_button(f"📥 LOTE {part[-5]}", f.read(), part, use_container_width=True)
+            botao_download_partes(st.session_state['org_zip_parts'], "org")
 
             st.markdown("### 📦 DOWNLOAD: SÓ XML")
-            for row in chunk_list(st.session_state['todos_zip_parts'], 3):
-                cols = st.columns(len(row))
-                for idx, part in enumerate(row):
-                    with open(part, 'rb') as f:
-                        cols[idx].download_button(f"📥 LOTE {part[-5]}", f.read(), part, use_container_width=True)
+            botao_download_partes(st.session_state['todos_zip_parts'], "todos")
 
-            st.download_button("📊 RELATÓRIO EXCEL", st.session_state['excel_buffer'], "relatorio.xlsx", use_container_width=True)
+            for caminho_rel in st.session_state['relatorios']:
+                if os.path.exists(caminho_rel):
+                    with open(caminho_rel, 'rb') as f_rel:
+                        st.download_button(f"📊 RELATÓRIO {os.path.basename(caminho_rel)}", f_rel, os.path.basename(caminho_rel),
+                                           key=f"dl_{caminho_rel}", use_container_width=True)
 
         if st.button("⛏️ NOVO GARIMPO / LIMPAR TUDO"):
             limpar_arquivos_temp(); st.session_state.clear(); st.rerun()
 
+        # =====================================================================
+        # PENEIRA: BUSCA PONTUAL POR CHAVE OU NÚMERO (DIRETO NO ÍNDICE)
+        # =====================================================================
+        st.divider()
+        st.markdown("### 🔍 PENEIRA DE NOTAS")
+        with st.expander("Encontre uma nota pela chave (ou o começo dela) ou pelo número e baixe só o XML dela"):
+            p_chave, p_num, p_mod, p_ser = st.columns([3, 1, 1, 1])
+            busca_chave = "".join(p_chave.text_input("Chave de acesso (ou início):", key="pen_chave").split())
+            busca_num = "".join(filter(str.isdigit, p_num.text_input("Número:", key="pen_num")))
+            busca_mod = p_mod.selectbox("Modelo:", ["Todos"] + list(st.session_state['auditoria'].facetas()["modelos"]), key="pen_mod")
+            busca_ser = p_ser.text_input("Série:", key="pen_ser").strip()
+
+            achados_peneira = buscar_documentos(
+                chave=busca_chave or None,
+                numero=int(busca_num) if busca_num else None,
+                tipo=None if busca_mod == "Todos" else busca_mod,
+                serie=busca_ser or None
+            ) if busca_chave or busca_num else []
+
+            if achados_peneira:
+                motor = st.session_state['auditoria']
+                # Status final do lote (SEFAZ/precedência) quando a chave está nele
+                st.dataframe(pd.DataFrame([{
+                    "Modelo": l["tipo"], "Série": l["serie"], "Nota": l["numero"], "Chave": l["chave"],
+                    "Status Final": motor.status_final(l["chave"]) if l["chave"] in motor else l["status"],
+                    "Arquivo": l["arquivo"], "Origem": l["upload"]
+                } for l in achados_peneira]), use_container_width=True, hide_index=True)
+
+                rotulos_peneira = {f"{l['tipo']} | Série {l['serie']} | Nota {l['numero']} | {l['arquivo']} ({l['upload']})": l for l in achados_peneira}
+                escolha_peneira = st.selectbox("XML para baixar:", list(rotulos_peneira), key="pen_sel")
+                linha_peneira = rotulos_peneira[escolha_peneira]
+                # O XML só é lido no clique e fica guardado para os próximos reruns
+                # (um ZIP interno seria copiado de novo a cada leitura)
+                local_peneira = (linha_peneira["upload"], linha_peneira["aninhado"], linha_peneira["membro"])
+                xml_peneira = st.session_state.get('peneira_xml')
+                if xml_peneira is None or xml_peneira[0] != local_peneira:
+                    if st.button("📄 BUSCAR XML", key="pen_buscar", use_container_width=True):
+                        st.session_state['peneira_xml'] = (local_peneira, ler_documento(linha_peneira))
+                        st.rerun()
+                elif xml_peneira[1] is not None:
+                    st.download_button("📥 BAIXAR XML", xml_peneira[1], linha_peneira["arquivo"],
+                                       mime="application/xml", key="pen_dl", use_container_width=True)
+                else:
+                    st.warning("⚠️ O arquivo de origem deste XML não está mais disponível.")
+            elif busca_chave or busca_num:
+                st.info("ℹ️ Nenhuma nota encontrada no índice.")
+
         # =====================================================================
         # BLOCO 4: CRUZAMENTO FALTANTES DOMÍNIO SISTEMAS (CORREÇÃO DE DISCO)
         # =====================================================================
@@ -1264,16 +677,18 @@ if st.session_state['confirmado']:
             
             if pdf_dominio and st.button("🔎 BUSCAR XMLS NO LOTE", key="btn_run_dom"):
                 with st.spinner("Analisando e organizando arquivos..."):
-                    notas_pdf = extrair_notas_faltantes_dominio(pdf_dominio)
-                    if notas_pdf:
-                        ch_encontradas = []
-                        df_base = st.session_state['df_geral']
-                        for n in notas_pdf:
-                            f = df_base[(df_base['Série'].astype(str) == n['Série']) & 
-                                        (df_base['Nota'] == n['Número']) & 
-                                        (df_base['Status Final'] == 'NORMAIS')]
-                            if not f.empty: 
-                                ch_encontradas.append(f.iloc[0]['Chave'])
+                    try:
+                        faixas_pdf, paginas_pdf = ler_relatorio_dominio(pdf_dominio, workers=workers_garimpo)
+                    except Exception as e:
+                        st.error(f"❌ Não foi possível ler o PDF: {e}")
+                        faixas_pdf, paginas_pdf = [], []
+                    erros_pdf = [p for p in paginas_pdf if p['Situação'].startswith('ERRO')]
+                    if erros_pdf:
+                        st.warning(f"⚠️ {len(erros_pdf)} página(s) não puderam ser lidas:")
+                        st.dataframe(pd.DataFrame(erros_pdf), use_container_width=True, hide_index=True)
+                    if faixas_pdf:
+                        # Cruzamento por faixa (Série, Nota Inicial..Final) num índice só
+                        ch_encontradas = st.session_state['auditoria'].localizar_faixas(faixas_pdf)
                         
                         if ch_encontradas:
                             st.session_state['ch_falt_dom'] = ch_encontradas
@@ -1284,13 +699,8 @@ if st.session_state['confirmado']:
                             
                             # Criamos o arquivo físico no servidor
                             with zipfile.ZipFile(nome_arquivo_zip, "w", zipfile.ZIP_DEFLATED) as zf:
-                                for fn in os.listdir(TEMP_UPLOADS_DIR):
-                                    f_path = os.path.join(TEMP_UPLOADS_DIR, fn)
-                                    with open(f_path, "rb") as ft:
-                                        for name, data in extrair_recursivo(ft, fn):
-                                            res, _ = identify_xml_info(data, cnpj_limpo, name)
-                                            if res and res["Chave"] in ch_set: 
-                                                zf.writestr(f"{res['Pasta']}/{name}", data)
+                                for linha, z_origem, data in abrir_documentos(localizar_documentos(ch_set)):
+                                    gravar_documento(zf, f"{linha['pasta']}/{linha['arquivo']}", z_origem, linha["membro"], data)
                             
                             st.session_state['zip_dom_pronto'] = nome_arquivo_zip
                             st.success(f"✅ Sucesso! {len(ch_encontradas)} notas organizadas e prontas para baixar.")
@@ -0,0 +1,145 @@
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import CNPJ_CLIENTE, gerar_documentos, gravar_corpus
+from garimpeiro.cache_xml import CacheResumos
+from garimpeiro.exportacao import exportar_pacotes, gravar_relatorio, gravar_relatorio_excel
+from garimpeiro.garimpo import extrair_recursivo, garimpar_lote
+from garimpeiro.indice import abrir_indice, localizar_documentos, registrar_documentos
+from garimpeiro.motor_xml import identify_xml_info
+
+# --- BENCHMARK DAS ETAPAS DO GARIMPO ---
+# Gera um corpus sintético e mede cada etapa separadamente (tempo, docs/s e
+# pico de memória alocada pelo Python na etapa).
+# Uso: python bench/bench_garimpeiro.py [--docs 20000] [--workers 4] [--sem-memoria]
+
+
+class Etapas:
+    def __init__(self, medir_memoria):
+        self.medir_memoria = medir_memoria
+        self.linhas = []
+
+    def medir(self, rotulo, funcao, qtd_docs):
+        if self.medir_memoria:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        total = time.perf_counter() - inicio
+        pico = 0
+        if self.medir_memoria:
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.linhas.append((rotulo, total, qtd_docs, pico))
+        return resultado
+
+    def imprimir(self):
+        print(f"{'etapa':<28} {'tempo (s)':>10} {'docs/s':>12} {'pico (MB)':>10}")
+        for rotulo, total, qtd_docs, pico in self.linhas:
+            taxa = f"{qtd_docs / total:,.0f}" if qtd_docs and total else "-"
+            memoria = f"{pico / 2**20:.1f}" if self.medir_memoria else "-"
+            print(f"{rotulo:<28} {total:>10.3f} {taxa:>12} {memoria:>10}")
+        print(f"RSS máximo do processo: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+def main():
+    # Os workers (spawn) reimportam este arquivo; pandas e pyarrow ficam só aqui
+    from garimpeiro.auditoria import MotorAuditoria
+    from garimpeiro.sessao import restaurar_sessao, salvar_sessao
+
+    parser = argparse.ArgumentParser(description="Tempo e memória de cada etapa do garimpo")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--itens", type=int, default=20, help="itens <det> por NF-e")
+    parser.add_argument("--lacunas", type=float, default=0.02, help="chance de pular números numa série")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sem-memoria", action="store_true", help="não mede o pico (tracemalloc deixa tudo mais lento)")
+    parser.add_argument("--manter", action="store_true", help="não apaga a pasta de trabalho no final")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="bench_garimpeiro_")
+    origem = os.getcwd()
+    os.chdir(pasta)
+    try:
+        docs = gerar_documentos(args.docs, args.itens, args.lacunas, seed=args.seed)
+        caminhos = gravar_corpus("corpus", docs)
+        n = len(docs)
+        print(f"Corpus: {n} documentos em {pasta}/corpus "
+              f"({sum(os.path.getsize(c) for c in caminhos) / 2**20:.1f} MB)\n")
+
+        etapas = Etapas(not args.sem_memoria)
+
+        etapas.medir("identify_xml_info", lambda: [identify_xml_info(d, CNPJ_CLIENTE, nome) for nome, d in docs], n)
+
+        def _extrair():
+            qtd = 0
+            for caminho in caminhos:
+                with open(caminho, "rb") as f:
+                    for _ in extrair_recursivo(f, os.path.basename(caminho)):
+                        qtd += 1
+            return qtd
+        etapas.medir("extrair_recursivo", _extrair, n)
+
+        conn = abrir_indice(recriar=True)
+        lote_dict = etapas.medir(
+            f"garimpo ({args.workers} worker(s))",
+            lambda: garimpar_lote(caminhos, CNPJ_CLIENTE, workers=args.workers,
+                                  ao_registrar=lambda achados: registrar_documentos(conn, achados)),
+            n
+        )
+        conn.commit()
+        conn.close()
+
+        for rodada in ("frio", "quente"):
+            cache = CacheResumos("cache_bench.sqlite")
+            etapas.medir(f"garimpo com cache ({rodada})",
+                         lambda: garimpar_lote(caminhos, CNPJ_CLIENTE, workers=args.workers, cache=cache), n)
+            cache.salvar()
+            cache.fechar()
+
+        def _auditar():
+            motor = MotorAuditoria()
+            motor.carregar(lote_dict)
+            motor.tabelas()
+            return motor
+        motor = etapas.medir("auditoria (carga completa)", _auditar, len(lote_dict))
+
+        def _marcar_buracos():
+            faltantes = motor.df_faltantes().head(3)
+            for _, row in faltantes.iterrows():
+                motor.adicionar({
+                    "Arquivo": "REGISTRO_MANUAL", "Chave": f"MANUAL_INUT_{row['Tipo']}_{row['Série']}_{row['Nº Faltante']}",
+                    "Tipo": row["Tipo"], "Série": row["Série"], "Número": int(row["Nº Faltante"]), "Status": "INUTILIZADOS",
+                    "Pasta": "EMITIDOS_CLIENTE/MANUAL", "Valor": 0.0, "Conteúdo": b"", "Ano": "0000", "Mes": "01",
+                    "Operacao": "SAIDA", "Data_Emissao": "", "CNPJ_Emit": CNPJ_CLIENTE, "Nome_Emit": "INSERÇÃO MANUAL",
+                    "Doc_Dest": "", "Nome_Dest": ""
+                }, True)
+            motor.tabelas()
+        etapas.medir("auditoria (3 buracos)", _marcar_buracos, 0)
+
+        df_geral = etapas.medir("df_geral", motor.df_geral, len(lote_dict))
+        chaves = set(df_geral["Chave"].tolist())
+        etapas.medir("exportação (ZIPs)", lambda: exportar_pacotes(localizar_documentos(chaves), workers=args.workers), len(chaves))
+        etapas.medir("relatório Excel", lambda: gravar_relatorio_excel(df_geral, "relatorio.xlsx", motor.abas_relatorio()), len(df_geral))
+        etapas.medir("relatório Parquet", lambda: gravar_relatorio(df_geral, "relatorio.parquet", motor.abas_relatorio()), len(df_geral))
+        etapas.medir("sessão (salvar)", lambda: salvar_sessao(motor, "bench", pasta_uploads="corpus"), len(motor))
+        etapas.medir("sessão (restaurar)", lambda: restaurar_sessao("bench", pasta_uploads="corpus_restaurado"), len(motor))
+
+        etapas.imprimir()
+    finally:
+        os.chdir(origem)
+        if args.manter:
+            print(f"Pasta de trabalho mantida: {pasta}")
+        else:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
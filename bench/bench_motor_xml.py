@@ -0,0 +1,50 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import CNPJ_CLIENTE, gerar_cte, gerar_evento, gerar_inutilizacao, gerar_mdfe, gerar_nfe
+from garimpeiro.motor_xml import identify_xml_info
+
+# --- MICRO-BENCHMARK DO MOTOR DE IDENTIFICAÇÃO ---
+# Uso: python bench/bench_motor_xml.py [--docs 2000] [--itens 40]
+
+
+def medir(rotulo, docs, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for d in docs:
+            identify_xml_info(d, CNPJ_CLIENTE, "doc.xml")
+    total = time.perf_counter() - inicio
+    n = len(docs) * repeticoes
+    print(f"{rotulo:<24} {total / n * 1e6:>10.1f} µs/doc {n / total:>12,.0f} docs/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo por documento de identify_xml_info")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--itens", type=int, default=40, help="itens <det> por NF-e")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(42)
+    grupos = {
+        "NF-e": [gerar_nfe("55", n, args.itens) for n in range(1, args.docs + 1)],
+        "NF-e (grande, >45KB)": [gerar_nfe("55", n, 400) for n in range(1, args.docs // 10 + 1)],
+        "NFC-e": [gerar_nfe("65", n, 3) for n in range(1, args.docs + 1)],
+        "CT-e": [gerar_cte(n) for n in range(1, args.docs + 1)],
+        "MDF-e": [gerar_mdfe(n) for n in range(1, args.docs + 1)],
+        "Cancelamento (110111)": [gerar_evento(n, "110111") for n in range(1, args.docs + 1)],
+        "CC-e (110110)": [gerar_evento(n, "110110") for n in range(1, args.docs + 1)],
+        "Inutilização": [gerar_inutilizacao(n, n + 5) for n in range(1, args.docs + 1)],
+    }
+
+    for rotulo, docs in grupos.items():
+        medir(rotulo, docs, args.repeticoes)
+
+
+if __name__ == "__main__":
+    main()
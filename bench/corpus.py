@@ -0,0 +1,157 @@
+import io
+import os
+import random
+import zipfile
+
+# --- GERADOR DE CORPUS SINTÉTICO ---
+# Documentos no formato que o motor lê (NF-e, NFC-e, CT-e, MDF-e, eventos de
+# cancelamento 110111 e CC-e 110110, inutilizações), com séries esburacadas
+# e ZIPs aninhados, para medir o garimpo com volumes configuráveis.
+
+CNPJ_CLIENTE = "12345678000199"
+CNPJ_FORNECEDOR = "98765432000155"
+
+
+def _chave(cuf, aamm, cnpj, modelo, serie, numero):
+    base = f"{cuf}{aamm}{cnpj}{modelo}{serie:03d}{numero:09d}1{random.randint(0, 10**8 - 1):08d}"
+    return base + "0"
+
+
+def gerar_nfe(modelo, numero, itens, serie=1, cnpj=CNPJ_CLIENTE):
+    chave = _chave("35", "2403", cnpj, modelo, serie, numero)
+    det = "".join(
+        f'<det nItem="{i}"><prod><cProd>{i}</cProd><xProd>PRODUTO {i}</xProd><NCM>84713012</NCM>'
+        f'<vProd>{random.randint(1, 999)}.00</vProd></prod><imposto><ICMS><ICMS00><orig>0</orig>'
+        f'<CST>00</CST><vBC>10.00</vBC><pICMS>18.00</pICMS><vICMS>1.80</vICMS></ICMS00></ICMS></imposto></det>'
+        for i in range(1, itens + 1)
+    )
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><nfeProc versao="4.00"><NFe><infNFe versao="4.00" Id="NFe{chave}">'
+        f'<ide><cUF>35</cUF><mod>{modelo}</mod><serie>{serie}</serie><nNF>{numero}</nNF>'
+        f'<dhEmi>2024-03-15T10:00:00-03:00</dhEmi><tpNF>1</tpNF></ide>'
+        f'<emit><CNPJ>{cnpj}</CNPJ><xNome>EMPRESA {cnpj} LTDA</xNome></emit>'
+        f'<dest><CPF>12345678909</CPF><xNome>Consumidor Final</xNome></dest>{det}'
+        f'<total><ICMSTot><vNF>{random.randint(10, 9999)}.50</vNF></ICMSTot></total></infNFe></NFe>'
+        f'<protNFe><infProt><chNFe>{chave}</chNFe><cStat>100</cStat></infProt></protNFe></nfeProc>'
+    ).encode()
+
+
+def gerar_cte(numero, serie=1, cnpj=CNPJ_CLIENTE):
+    chave = _chave("35", "2403", cnpj, "57", serie, numero)
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><cteProc versao="4.00"><CTe><infCte versao="4.00" Id="CTe{chave}">'
+        f'<ide><cUF>35</cUF><mod>57</mod><serie>{serie}</serie><nCT>{numero}</nCT>'
+        f'<dhEmi>2024-03-12T08:30:00-03:00</dhEmi></ide>'
+        f'<emit><CNPJ>{cnpj}</CNPJ><xNome>TRANSPORTADORA {cnpj}</xNome></emit>'
+        f'<dest><CNPJ>{CNPJ_FORNECEDOR}</CNPJ><xNome>DESTINATARIO</xNome></dest>'
+        f'<vPrest><vTPrest>{random.randint(100, 5000)}.00</vTPrest></vPrest></infCte></CTe>'
+        f'<protCTe><infProt><chCTe>{chave}</chCTe><cStat>100</cStat></infProt></protCTe></cteProc>'
+    ).encode()
+
+
+def gerar_mdfe(numero, serie=1, cnpj=CNPJ_CLIENTE):
+    chave = _chave("35", "2403", cnpj, "58", serie, numero)
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><mdfeProc versao="3.00"><MDFe><infMDFe versao="3.00" Id="MDFe{chave}">'
+        f'<ide><cUF>35</cUF><mod>58</mod><serie>{serie}</serie><nMDF>{numero}</nMDF>'
+        f'<dhEmi>2024-03-18T07:00:00-03:00</dhEmi></ide>'
+        f'<emit><CNPJ>{cnpj}</CNPJ><xNome>EMPRESA {cnpj} LTDA</xNome></emit></infMDFe></MDFe>'
+        f'<protMDFe><infProt><chMDFe>{chave}</chMDFe><cStat>100</cStat></infProt></protMDFe></mdfeProc>'
+    ).encode()
+
+
+def gerar_evento(numero, tp_evento, modelo="55", serie=1, cnpj=CNPJ_CLIENTE):
+    chave = _chave("35", "2403", cnpj, modelo, serie, numero)
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><procEventoNFe><evento><infEvento Id="ID{tp_evento}{chave}01">'
+        f'<CNPJ>{cnpj}</CNPJ><chNFe>{chave}</chNFe><dhEvento>2024-03-20T09:00:00-03:00</dhEvento>'
+        f'<tpEvento>{tp_evento}</tpEvento></infEvento></evento></procEventoNFe>'
+    ).encode()
+
+
+def gerar_inutilizacao(inicio, fim, modelo="55", serie=1, cnpj=CNPJ_CLIENTE):
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><procInutNFe><inutNFe><infInut><ano>24</ano>'
+        f'<CNPJ>{cnpj}</CNPJ><mod>{modelo}</mod><serie>{serie}</serie><nNFIni>{inicio}</nNFIni>'
+        f'<nNFFin>{fim}</nNFFin></infInut></inutNFe></procInutNFe>'
+    ).encode()
+
+
+def gerar_documentos(total, itens=20, lacunas=0.02, cancelados=0.02, cces=0.01, inutilizacoes=0.005, seed=42):
+    # Lista de (nome, bytes) com ~total documentos. As séries próprias pulam
+    # números com probabilidade "lacunas"; parte dos pulos vira inutilização.
+    random.seed(seed)
+    docs = []
+    series = [("55", 1, 0.45), ("55", 2, 0.10), ("65", 1, 0.20), ("57", 1, 0.05), ("58", 1, 0.02)]
+    proximo = {(modelo, serie): 1 for modelo, serie, _ in series}
+    terceiros = 0.18
+
+    while len(docs) < total:
+        sorteio = random.random()
+        if sorteio < terceiros:
+            numero = random.randint(1, 10**6)
+            docs.append((f"terc_{len(docs)}.xml", gerar_nfe("55", numero, itens, cnpj=CNPJ_FORNECEDOR)))
+            continue
+
+        acumulado = terceiros
+        for modelo, serie, peso in series:
+            acumulado += peso
+            if sorteio < acumulado:
+                break
+        sk = (modelo, serie)
+        numero = proximo[sk]
+
+        if random.random() < lacunas:
+            salto = random.randint(1, 5)
+            if random.random() < inutilizacoes / lacunas and modelo in ("55", "65"):
+                docs.append((f"inut_{modelo}_{serie}_{numero}.xml", gerar_inutilizacao(numero, numero + salto - 1, modelo, serie)))
+            numero += salto
+
+        if modelo == "57":
+            docs.append((f"cte_{serie}_{numero}.xml", gerar_cte(numero, serie)))
+        elif modelo == "58":
+            docs.append((f"mdfe_{serie}_{numero}.xml", gerar_mdfe(numero, serie)))
+        else:
+            docs.append((f"nfe_{modelo}_{serie}_{numero}.xml", gerar_nfe(modelo, numero, itens if modelo == "55" else 3, serie)))
+            if random.random() < cancelados:
+                docs.append((f"canc_{modelo}_{serie}_{numero}.xml", gerar_evento(numero, "110111", modelo, serie)))
+            if random.random() < cces:
+                docs.append((f"cce_{modelo}_{serie}_{numero}.xml", gerar_evento(numero, "110110", modelo, serie)))
+        proximo[sk] = numero + 1
+
+    return docs
+
+
+def gravar_corpus(pasta, docs, soltos=0.01, aninhados=0.3):
+    # lote_principal.zip com a maior parte dos documentos, um ZIP mensal
+    # dentro dele (que por sua vez contém outro ZIP) e alguns XMLs soltos.
+    os.makedirs(pasta, exist_ok=True)
+    n_soltos = int(len(docs) * soltos)
+    n_aninhados = int(len(docs) * aninhados)
+    soltos_docs = docs[:n_soltos]
+    aninhados_docs = docs[n_soltos:n_soltos + n_aninhados]
+    principais = docs[n_soltos + n_aninhados:]
+
+    metade = len(aninhados_docs) // 2
+    profundo = io.BytesIO()
+    with zipfile.ZipFile(profundo, "w", zipfile.ZIP_DEFLATED) as z:
+        for nome, dados in aninhados_docs[:metade]:
+            z.writestr(f"retificacoes/{nome}", dados)
+    mensal = io.BytesIO()
+    with zipfile.ZipFile(mensal, "w", zipfile.ZIP_DEFLATED) as z:
+        for nome, dados in aninhados_docs[metade:]:
+            z.writestr(f"2024-03/{nome}", dados)
+        z.writestr("2024-03/retificacoes.zip", profundo.getvalue())
+
+    caminhos = [os.path.join(pasta, "lote_principal.zip")]
+    with zipfile.ZipFile(caminhos[0], "w", zipfile.ZIP_DEFLATED) as z:
+        for nome, dados in principais:
+            z.writestr(f"xmls/{nome}", dados)
+        z.writestr("mensal/2024-03.zip", mensal.getvalue())
+
+    for nome, dados in soltos_docs:
+        caminho = os.path.join(pasta, nome)
+        with open(caminho, "wb") as f:
+            f.write(dados)
+        caminhos.append(caminho)
+    return caminhos
@@ -0,0 +1,62 @@
+# --- O GARIMPEIRO: MOTOR SEM INTERFACE ---
+# Tudo o que a tela do Streamlit usa, importável por scripts e jobs em lote.
+# Os nomes abaixo só carregam o módulo de origem no primeiro uso: os workers
+# do garimpo e da exportação importam o pacote sem trazer pandas, pyarrow,
+# openpyxl e pdfplumber junto.
+from importlib import import_module
+
+_ORIGEM = {
+    "CacheResumos": "cache_xml",
+    "MotorAuditoria": "auditoria",
+    "auditar_arquivos": "processamento",
+    "expandir_faixas": "auditoria",
+    "extrair_notas_faltantes_dominio": "dominio",
+    "exportar_pacotes": "exportacao",
+    "extrair_recursivo": "garimpo",
+    "garimpar_lote": "garimpo",
+    "gravar_documento": "exportacao",
+    "gravar_relatorio": "exportacao",
+    "gravar_relatorio_excel": "exportacao",
+    "identify_xml_info": "motor_xml",
+    "ler_relatorio_autenticidade": "autenticidade",
+    "ler_relatorio_dominio": "dominio",
+    "ler_upload": "garimpo",
+    "listar_sessoes": "sessao",
+    "restaurar_sessao": "sessao",
+    "salvar_sessao": "sessao",
+    "salvar_upload": "garimpo",
+}
+
+__all__ = [
+    "CacheResumos",
+    "MotorAuditoria",
+    "auditar_arquivos",
+    "expandir_faixas",
+    "extrair_notas_faltantes_dominio",
+    "exportar_pacotes",
+    "extrair_recursivo",
+    "garimpar_lote",
+    "gravar_documento",
+    "gravar_relatorio",
+    "gravar_relatorio_excel",
+    "identify_xml_info",
+    "ler_relatorio_autenticidade",
+    "ler_relatorio_dominio",
+    "ler_upload",
+    "listar_sessoes",
+    "restaurar_sessao",
+    "salvar_sessao",
+    "salvar_upload",
+]
+
+
+def __getattr__(nome):
+    if nome not in _ORIGEM:
+        raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+    valor = getattr(import_module(f".{_ORIGEM[nome]}", __name__), nome)
+    globals()[nome] = valor
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
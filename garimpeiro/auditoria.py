@@ -0,0 +1,609 @@
+import numpy as np
+import pandas as pd
+
+from .colunar import LoteColunar
+from .garimpo import STATUS_PRIORITARIOS
+
+# --- MOTOR DE AUDITORIA INCREMENTAL ---
+# Mantém o lote (chave -> documento vencedor) e todas as tabelas derivadas.
+# Cada inclusão, remoção ou mudança de status mexe só nos registros da chave
+# afetada e na série (Tipo, Série) dela; resumo e buracos são recalculados
+# apenas para as séries marcadas como sujas.
+
+# Inutilizações digitadas na tela (chaves MANUAL_INUT_...) vêm com este Arquivo
+ARQUIVO_MANUAL = "REGISTRO_MANUAL"
+
+# "Status Final" de df_geral para cada status do XML que muda de nome
+ROTULOS_STATUS = {"INUTILIZADOS": "INUTILIZADA"}
+
+
+# --- BURACOS POR INTERVALO ---
+# Uma faixa faltante maior que isso (ex.: nota 999999999 lida de uma chave
+# quebrada) não é expandida número a número; vai para as faixas suspeitas.
+LIMITE_FAIXA_EXPANDIDA = 50000
+# Teto de linhas de df_faltantes somando todas as séries. Os buracos ficam
+# guardados como intervalos e só viram uma linha por número ao montar a
+# tabela; os que não cabem no teto são listados como faixa, junto com as
+# suspeitas.
+LIMITE_FALTANTES_EXPANDIDOS = 200000
+
+
+def unir_intervalos(inicios, fins):
+    # Funde intervalos que se sobrepõem ou encostam; devolve os blocos
+    # contínuos ordenados, sem montar range(min, max).
+    ordem = np.argsort(inicios, kind="stable")
+    inicios = inicios[ordem]
+    fins = np.maximum.accumulate(fins[ordem])
+    novo_bloco = np.empty(len(inicios), dtype=bool)
+    novo_bloco[0] = True
+    novo_bloco[1:] = inicios[1:] > fins[:-1] + 1
+    idx = np.flatnonzero(novo_bloco)
+    ultimos = np.append(idx[1:] - 1, len(fins) - 1)
+    return inicios[idx], fins[ultimos]
+
+
+def intervalos_faltantes(blocos_ini, blocos_fim):
+    # Entre dois blocos contínuos vizinhos há sempre ao menos um número faltante
+    return list(zip((blocos_fim[:-1] + 1).tolist(), (blocos_ini[1:] - 1).tolist()))
+
+
+def expandir_intervalos(intervalos):
+    if not intervalos:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([np.arange(ini, fim + 1, dtype=np.int64) for ini, fim in intervalos])
+
+
+def expandir_faixas(df):
+    # Linhas de inutilização carregam a faixa inteira (Nota .. Nota Final);
+    # só na hora de gravar o Excel viram uma linha por número.
+    if df.empty or "Nota Final" not in df.columns:
+        return df
+    qtd = (df["Nota Final"] - df["Nota"] + 1).clip(lower=1)
+    expandido = df.loc[df.index.repeat(qtd)].copy()
+    expandido["Nota"] = expandido["Nota"] + expandido.groupby(level=0).cumcount()
+    return expandido.drop(columns="Nota Final").reset_index(drop=True)
+
+
+class MotorAuditoria:
+    def __init__(self):
+        self.lote = LoteColunar()
+        self.status_sefaz = {}
+        self.divergencias = np.empty(0, dtype=np.int64)
+
+        self._series = {}
+        self._sujas = set()
+        self._resumo = {}
+        self._faltantes = {}
+        self._suspeitas = {}
+
+        self._manuais = set()
+        self._facetas = {"origens": {}, "anos_meses": {}, "modelos": {}, "series": {}, "status": {}}
+        self._canceladas = set()
+        self._autorizadas = set()
+        self._inutilizadas = set()
+        self._qtd_inutilizadas = 0
+
+        self._cache = {}
+        self._desatualizadas = set()
+
+    # --- CONSULTAS ---
+    def __len__(self):
+        return len(self.lote)
+
+    def __contains__(self, chave):
+        return chave in self.lote
+
+    def documentos(self):
+        return self.lote.documentos()
+
+    def documentos_manuais(self):
+        return [self.lote.documento(pos) for pos in sorted(self._manuais)]
+
+    def status_final(self, chave):
+        return self._status_final(self.lote.posicao[chave])
+
+    def _status_final(self, pos):
+        return self.status_sefaz.get(pos) or self.lote.valor(pos, "Status")
+
+    def facetas(self):
+        # Valores dos filtros da ETAPA 3 com a quantidade de documentos de
+        # cada um; as contagens são mantidas a cada inclusão/remoção.
+        return {
+            nome: {valor: qtd for valor, qtd in sorted(contagem.items()) if qtd > 0}
+            for nome, contagem in self._facetas.items()
+        }
+
+    def _contar_facetas(self, pos, delta):
+        # Conta o que vira linha de df_geral, com o mesmo "Status Final" que
+        # filtrar_geral testa; chamar antes e depois de mudar status_sefaz
+        lote = self.lote
+        contagens = self._facetas
+        status = self._status_final(pos)
+        if status == "INUTILIZADOS" and lote.fins[pos] < lote.numeros[pos]:
+            return
+        status = ROTULOS_STATUS.get(status, status)
+        ano = lote.valor(pos, "Ano")
+        if ano != "0000":
+            mes = f"{ano}/{lote.valor(pos, 'Mes')}"
+            contagens["anos_meses"][mes] = contagens["anos_meses"].get(mes, 0) + delta
+        for nome, valor in (
+            ("origens", "EMISSÃO PRÓPRIA" if lote.proprios[pos] else "TERCEIROS"),
+            ("modelos", lote.valor(pos, "Tipo")),
+            ("series", str(lote.valor(pos, "Série"))),
+            ("status", status)
+        ):
+            contagens[nome][valor] = contagens[nome].get(valor, 0) + delta
+
+    def _contar_todas_facetas(self, posicoes):
+        # Mesmas contagens de _contar_facetas(pos, 1), de uma vez, sobre os códigos
+        lote = self.lote
+        contagens = self._facetas
+        posicoes = self._posicoes_geral(posicoes)
+
+        def somar(nome, rotulos, qtds):
+            for valor, qtd in zip(rotulos, qtds.tolist()):
+                if qtd:
+                    contagens[nome][valor] = contagens[nome].get(valor, 0) + qtd
+
+        proprios = lote.proprios_np(posicoes).astype(np.int64)
+        somar("origens", ["TERCEIROS", "EMISSÃO PRÓPRIA"], np.bincount(proprios, minlength=2))
+        for nome, campo, rotulo in (("modelos", "Tipo", None), ("series", "Série", str)):
+            coluna = lote.categoricas[campo]
+            rotulos = [rotulo(v) for v in coluna.categorias] if rotulo else coluna.categorias
+            somar(nome, rotulos, np.bincount(coluna.codigos_np(posicoes), minlength=len(coluna.categorias)))
+        codigos, categorias = self._status_final_codigos(posicoes)
+        somar("status", [ROTULOS_STATUS.get(c, c) for c in categorias], np.bincount(codigos, minlength=len(categorias)))
+
+        anos, meses = lote.categoricas["Ano"], lote.categoricas["Mes"]
+        codigos_ano = anos.codigos_np(posicoes)
+        com_ano = np.array([ano != "0000" for ano in anos.categorias], dtype=bool)[codigos_ano]
+        pares = codigos_ano[com_ano].astype(np.int64) * len(meses.categorias) + meses.codigos_np(posicoes)[com_ano]
+        pares, qtds = np.unique(pares, return_counts=True)
+        somar("anos_meses", [f"{anos.categorias[p // len(meses.categorias)]}/{meses.categorias[p % len(meses.categorias)]}"
+                             for p in pares.tolist()], qtds)
+
+    def localizar_faixas(self, faixas, status="NORMAIS"):
+        # faixas: [(série, início, fim), ...]. Chaves dos documentos com esse
+        # status final cuja (Série, Nota) cai em cada faixa, na ordem das faixas
+        # e por número dentro delas; para a mesma (Série, Nota) vale o primeiro
+        # do lote. Um único índice ordenado por (série, número) atende todas.
+        pos = self.lote.posicoes_ativas()
+        codigos, categorias = self._status_final_codigos(pos)
+        if status not in categorias:
+            return []
+        pos = pos[codigos == categorias.index(status)]
+
+        coluna_serie = self.lote.categoricas["Série"]
+        series = coluna_serie.codigos_np(pos)
+        numeros = self.lote.numeros_np(pos)
+        ordem = np.lexsort((pos, numeros, series))
+        series, numeros, pos = series[ordem], numeros[ordem], pos[ordem]
+        primeiros = np.ones(len(pos), dtype=bool)
+        primeiros[1:] = (series[1:] != series[:-1]) | (numeros[1:] != numeros[:-1])
+        series, numeros, pos = series[primeiros], numeros[primeiros], pos[primeiros]
+
+        codigo_serie = {str(s): c for c, s in enumerate(coluna_serie.categorias)}
+        chaves = []
+        for serie, inicio, fim in faixas:
+            codigo = codigo_serie.get(str(serie))
+            if codigo is None:
+                continue
+            a, b = np.searchsorted(series, [codigo, codigo + 1])
+            i, j = a + np.searchsorted(numeros[a:b], [inicio, fim + 1])
+            chaves.extend(self.lote.chaves[p] for p in pos[i:j].tolist())
+        return chaves
+
+    # --- DELTAS ---
+    def carregar(self, lote_dict):
+        for res, is_p in lote_dict.values():
+            self.adicionar(res, is_p)
+
+    def reconstruir(self):
+        # Refaz séries, facetas e conjuntos a partir de lote, status_sefaz e
+        # divergencias já preenchidos (ver sessao.restaurar_sessao); a
+        # precedência entre chaves repetidas já foi resolvida no lote.
+        self._contar_todas_facetas(self.lote.posicoes_ativas())
+        for pos in self.lote.posicao.values():
+            if self.lote.arquivos[pos] == ARQUIVO_MANUAL:
+                self._manuais.add(pos)
+            self._aplicar(pos)
+
+    def adicionar(self, res, is_p):
+        pos = self.lote.posicao.get(res["Chave"])
+        if pos is not None:
+            if res["Status"] not in STATUS_PRIORITARIOS:
+                return False
+            self._retirar(pos)
+            self._contar_facetas(pos, -1)
+        # Uma chave já existente é sobrescrita na mesma posição do lote
+        pos = self.lote.gravar(res, is_p)
+        self._contar_facetas(pos, 1)
+        if res["Arquivo"] == ARQUIVO_MANUAL:
+            self._manuais.add(pos)
+        else:
+            self._manuais.discard(pos)
+        self._aplicar(pos)
+        return True
+
+    def remover(self, chave):
+        pos = self.lote.posicao.get(chave)
+        if pos is None:
+            return False
+        self._retirar(pos)
+        self._contar_facetas(pos, -1)
+        self.lote.apagar(chave)
+        self._manuais.discard(pos)
+        self.status_sefaz.pop(pos, None)
+        if pos in self.divergencias:
+            self.divergencias = self.divergencias[self.divergencias != pos]
+            self._desatualizadas.add("divergencias")
+        return True
+
+    def aplicar_autenticidade(self, relatorio):
+        # relatorio: DataFrame Chave/Status lido do relatório da SEFAZ (ver
+        # autenticidade.ler_relatorio_autenticidade) ou dict chave -> status.
+        # Um único join por Chave; só as chaves cujo status imposto mudou em
+        # relação à validação anterior são refeitas.
+        if isinstance(relatorio, dict):
+            relatorio = pd.DataFrame({"Chave": list(relatorio), "Status": list(relatorio.values())}, dtype=object)
+
+        canceladas = relatorio.loc[relatorio["Status"].str.contains("CANCEL", regex=False, na=False), "Chave"]
+        posicoes = np.unique(canceladas.map(self.lote.posicao).dropna().to_numpy(dtype=np.int64))
+        novos = dict.fromkeys(posicoes.tolist(), "CANCELADOS")
+
+        afetadas = set(self.status_sefaz) ^ set(novos)
+        for pos in afetadas:
+            self._retirar(pos)
+            self._contar_facetas(pos, -1)
+        self.status_sefaz = novos
+        for pos in afetadas:
+            self._aplicar(pos)
+            self._contar_facetas(pos, 1)
+
+        # Divergência: o XML diz autorizada e a SEFAZ diz cancelada
+        status_xml = self.lote.categoricas["Status"]
+        normais = status_xml.codigos_np(posicoes) == status_xml.codificar("NORMAIS")
+        self.divergencias = posicoes[normais]
+        self._desatualizadas.add("divergencias")
+
+    # --- APLICAÇÃO / RETIRADA DE UMA POSIÇÃO DO LOTE ---
+    def _aplicar(self, pos):
+        self._desatualizadas.add("geral")
+        if not self.lote.proprios[pos]:
+            return
+
+        status_final = self._status_final(pos)
+        sk = (self.lote.valor(pos, "Tipo"), self.lote.valor(pos, "Série"))
+        serie = self._series.get(sk)
+        if serie is None:
+            serie = self._series[sk] = {"faixas": {}, "valor": 0.0, "docs": 0}
+        serie["docs"] += 1
+
+        numero = self.lote.numeros[pos]
+        if status_final == "INUTILIZADOS":
+            fim = self.lote.fins[pos]
+            if fim >= numero:
+                serie["faixas"][(numero, fim)] = serie["faixas"].get((numero, fim), 0) + 1
+                self._inutilizadas.add(pos)
+                self._qtd_inutilizadas += fim - numero + 1
+                self._desatualizadas.add("inutilizadas")
+        elif numero > 0:
+            serie["faixas"][(numero, numero)] = serie["faixas"].get((numero, numero), 0) + 1
+            if status_final == "CANCELADOS":
+                self._canceladas.add(pos)
+                self._desatualizadas.add("canceladas")
+            elif status_final == "NORMAIS":
+                self._autorizadas.add(pos)
+                self._desatualizadas.add("autorizadas")
+            serie["valor"] += self.lote.valores[pos]
+
+        self._sujas.add(sk)
+
+    def _retirar(self, pos):
+        self._desatualizadas.add("geral")
+        if not self.lote.proprios[pos]:
+            return
+
+        status_final = self._status_final(pos)
+        sk = (self.lote.valor(pos, "Tipo"), self.lote.valor(pos, "Série"))
+        serie = self._series[sk]
+        serie["docs"] -= 1
+
+        numero = self.lote.numeros[pos]
+        faixa = None
+        if status_final == "INUTILIZADOS":
+            if pos in self._inutilizadas:
+                fim = self.lote.fins[pos]
+                faixa = (numero, fim)
+                self._inutilizadas.discard(pos)
+                self._qtd_inutilizadas -= fim - numero + 1
+                self._desatualizadas.add("inutilizadas")
+        elif numero > 0:
+            faixa = (numero, numero)
+            if pos in self._canceladas:
+                self._canceladas.discard(pos)
+                self._desatualizadas.add("canceladas")
+            if pos in self._autorizadas:
+                self._autorizadas.discard(pos)
+                self._desatualizadas.add("autorizadas")
+            serie["valor"] -= self.lote.valores[pos]
+
+        if faixa is not None:
+            if serie["faixas"][faixa] == 1:
+                del serie["faixas"][faixa]
+            else:
+                serie["faixas"][faixa] -= 1
+
+        if serie["docs"] == 0:
+            del self._series[sk]
+        self._sujas.add(sk)
+
+    # --- RESUMO E BURACOS (SÓ SÉRIES SUJAS) ---
+    def _atualizar_series(self):
+        if self._sujas:
+            self._desatualizadas.update(("resumo", "faltantes", "suspeitas"))
+        for sk in self._sujas:
+            self._resumo.pop(sk, None)
+            self._faltantes.pop(sk, None)
+            self._suspeitas.pop(sk, None)
+            dados = self._series.get(sk)
+            if not dados or not dados["faixas"]:
+                continue
+
+            t, s = sk
+            faixas = np.array(list(dados["faixas"]), dtype=np.int64)
+            blocos_ini, blocos_fim = unir_intervalos(faixas[:, 0], faixas[:, 1])
+            self._resumo[sk] = {
+                "Documento": t,
+                "Série": s,
+                "Início": int(blocos_ini[0]),
+                "Fim": int(blocos_fim[-1]),
+                "Quantidade": int((blocos_fim - blocos_ini + 1).sum()),
+                "Valor Contábil (R$)": round(dados["valor"], 2)
+            }
+            intervalos = intervalos_faltantes(blocos_ini, blocos_fim)
+            normais = [(ini, fim) for ini, fim in intervalos if fim - ini + 1 <= LIMITE_FAIXA_EXPANDIDA]
+            if normais:
+                self._faltantes[sk] = normais
+            if len(normais) < len(intervalos):
+                self._suspeitas[sk] = [
+                    {"Tipo": t, "Série": s, "Faltantes de": ini, "Até": fim, "Quantidade": fim - ini + 1}
+                    for ini, fim in intervalos if fim - ini + 1 > LIMITE_FAIXA_EXPANDIDA
+                ]
+        self._sujas.clear()
+
+    # --- TABELAS ---
+    def _em_cache(self, nome, construir):
+        if nome in self._desatualizadas or nome not in self._cache:
+            self._cache[nome] = construir()
+            self._desatualizadas.discard(nome)
+        return self._cache[nome]
+
+    def _coluna(self, campo, posicoes):
+        # Categórica quando há mais linhas que valores distintos; senão texto
+        coluna = self.lote.categoricas[campo]
+        if len(posicoes) >= len(coluna.categorias):
+            return coluna.categorica(posicoes)
+        return [coluna.categorias[c] for c in coluna.codigos_np(posicoes).tolist()]
+
+    def _status_final_codigos(self, posicoes):
+        coluna = self.lote.categoricas["Status"]
+        categorias = list(coluna.categorias)
+        codigos = coluna.codigos_np(posicoes).copy()
+        if self.status_sefaz:
+            if "CANCELADOS" not in categorias:
+                categorias.append("CANCELADOS")
+            impostos = np.isin(posicoes, np.fromiter(self.status_sefaz, dtype=np.int64, count=len(self.status_sefaz)))
+            codigos[impostos] = categorias.index("CANCELADOS")
+        return codigos, categorias
+
+    def _quadro(self, posicoes, geral=False):
+        # Mesmo layout do registro detalhado de cada documento. Em df_geral as
+        # inutilizações levam "INUTILIZADA", valor zero e a faixa em Nota Final.
+        if len(posicoes) == 0:
+            return pd.DataFrame()
+        lote = self.lote
+        operacao = lote.categoricas["Operacao"]
+        n_ops = len(operacao.categorias)
+        origem = pd.Categorical.from_codes(
+            lote.proprios_np(posicoes).astype(np.int32) * n_ops + operacao.codigos_np(posicoes),
+            categories=[f"TERCEIROS ({o})" for o in operacao.categorias] + [f"EMISSÃO PRÓPRIA ({o})" for o in operacao.categorias]
+        )
+
+        status_codigos, status_categorias = self._status_final_codigos(posicoes)
+        numeros = lote.numeros_np(posicoes)
+        valores = lote.valores_np(posicoes)
+        if geral:
+            inut = status_codigos == (status_categorias.index("INUTILIZADOS") if "INUTILIZADOS" in status_categorias else -1)
+            if inut.any():
+                status_categorias = status_categorias + ["INUTILIZADA"]
+                status_codigos[inut] = len(status_categorias) - 1
+                valores = np.where(inut, 0.0, valores)
+            notas_finais = np.where(inut, lote.fins_np(posicoes), numeros)
+
+        quadro = pd.DataFrame({
+            "Origem": origem,
+            "Operação": self._coluna("Operacao", posicoes),
+            "Modelo": self._coluna("Tipo", posicoes),
+            "Série": self._coluna("Série", posicoes),
+            "Nota": numeros,
+            "Data Emissão": self._coluna("Data_Emissao", posicoes),
+            "CNPJ Emitente": self._coluna("CNPJ_Emit", posicoes),
+            "Nome Emitente": self._coluna("Nome_Emit", posicoes),
+            "Doc Destinatário": self._coluna("Doc_Dest", posicoes),
+            "Nome Destinatário": self._coluna("Nome_Dest", posicoes),
+            "Chave": [lote.chaves[p] for p in posicoes.tolist()],
+            "Status Final": pd.Categorical.from_codes(status_codigos, categories=status_categorias),
+            "Valor": valores,
+            "Ano": self._coluna("Ano", posicoes),
+            "Mes": self._coluna("Mes", posicoes)
+        })
+        if geral:
+            quadro["Nota Final"] = notas_finais
+        return quadro
+
+    def _posicoes(self, conjunto):
+        return np.array(sorted(conjunto), dtype=np.int64)
+
+    def df_resumo(self):
+        self._atualizar_series()
+        return self._em_cache("resumo", lambda: pd.DataFrame(
+            [self._resumo[sk] for sk in self._series if sk in self._resumo]
+        ))
+
+    def _expandir_faltantes(self):
+        # (DataFrame com um buraco por linha até LIMITE_FALTANTES_EXPANDIDOS,
+        #  faixas que ficaram de fora do teto)
+        quadros, fora_do_teto = [], []
+        restante = LIMITE_FALTANTES_EXPANDIDOS
+        for sk in self._series:
+            t, s = sk
+            cabem = []
+            for ini, fim in self._faltantes.get(sk, ()):
+                qtd = fim - ini + 1
+                if qtd <= restante:
+                    cabem.append((ini, fim))
+                    restante -= qtd
+                else:
+                    fora_do_teto.append({"Tipo": t, "Série": s, "Faltantes de": ini, "Até": fim, "Quantidade": qtd})
+            if cabem:
+                quadros.append(pd.DataFrame({"Tipo": t, "Série": s, "Nº Faltante": expandir_intervalos(cabem)}))
+        return (pd.concat(quadros, ignore_index=True) if quadros else pd.DataFrame()), fora_do_teto
+
+    def _faltantes_no_teto(self):
+        self._atualizar_series()
+        return self._em_cache("faltantes", self._expandir_faltantes)
+
+    def df_faltantes(self):
+        return self._faltantes_no_teto()[0]
+
+    def df_faixas_suspeitas(self):
+        fora_do_teto = self._faltantes_no_teto()[1]
+        return self._em_cache("suspeitas", lambda: pd.DataFrame(
+            [item for sk in self._series for item in self._suspeitas.get(sk, ())] + fora_do_teto
+        ))
+
+    def df_canceladas(self):
+        return self._em_cache("canceladas", lambda: self._quadro(self._posicoes(self._canceladas)))
+
+    def df_autorizadas(self):
+        return self._em_cache("autorizadas", lambda: self._quadro(self._posicoes(self._autorizadas)))
+
+    def df_inutilizadas(self):
+        def construir():
+            pos = self._posicoes(self._inutilizadas)
+            if len(pos) == 0:
+                return pd.DataFrame()
+            inicios = self.lote.numeros_np(pos)
+            fins = self.lote.fins_np(pos)
+            return pd.DataFrame({
+                "Modelo": self._coluna("Tipo", pos),
+                "Série": self._coluna("Série", pos),
+                "Nota Inicial": inicios,
+                "Nota Final": fins,
+                "Quantidade": fins - inicios + 1
+            })
+        return self._em_cache("inutilizadas", construir)
+
+    def _posicoes_geral(self, pos=None):
+        # Linhas de df_geral: faixas invertidas (fim < início) não geram linha,
+        # como range() vazio.
+        if pos is None:
+            pos = self.lote.posicoes_ativas()
+        codigos, categorias = self._status_final_codigos(pos)
+        if "INUTILIZADOS" in categorias:
+            inut = codigos == categorias.index("INUTILIZADOS")
+            pos = pos[~inut | (self.lote.fins_np(pos) >= self.lote.numeros_np(pos))]
+        return pos
+
+    def df_geral(self):
+        # Inutilizações ficam numa linha só (Nota .. Nota Final); ver expandir_faixas.
+        return self._em_cache("geral", lambda: self._quadro(self._posicoes_geral(), geral=True))
+
+    def filtrar_geral(self, origens=(), meses=(), modelos=(), series=(), status=(), mes_so_na_propria=True):
+        # Filtros da ETAPA 3 sobre df_geral. Os códigos das colunas categóricas
+        # já são o índice de cada faceta: cada filtro vira uma máscara booleana
+        # vetorizada e a combinação é um AND entre elas, sem montar texto.
+        pos = self._posicoes_geral()
+        lote = self.lote
+        cat = lote.categoricas
+        manter = np.ones(len(pos), dtype=bool)
+        proprios = lote.proprios_np(pos).astype(bool)
+
+        def _codigos(campo, valores):
+            valores = {str(v) for v in valores}
+            return [c for c, v in enumerate(cat[campo].categorias) if str(v) in valores]
+
+        if origens:
+            palavras = {o.split()[0] for o in origens}
+            if not ({"EMISSÃO", "TERCEIROS"} <= palavras):
+                manter &= proprios if "EMISSÃO" in palavras else ~proprios
+
+        if meses:
+            anos, mess = cat["Ano"], cat["Mes"]
+            pares = anos.codigos_np(pos).astype(np.int64) * len(mess.categorias) + mess.codigos_np(pos)
+            meses = set(meses)
+            desejados = [a * len(mess.categorias) + m
+                         for a, ano in enumerate(anos.categorias) for m, mes in enumerate(mess.categorias)
+                         if f"{ano}/{mes}" in meses]
+            no_mes = np.isin(pares, desejados)
+            manter &= (no_mes | ~proprios) if mes_so_na_propria else no_mes
+
+        if modelos:
+            manter &= np.isin(cat["Tipo"].codigos_np(pos), _codigos("Tipo", modelos))
+
+        if series:
+            manter &= np.isin(cat["Série"].codigos_np(pos), _codigos("Série", series))
+
+        if status:
+            # Mesmo "Status Final" de df_geral e das facetas (inutilizações
+            # como INUTILIZADA); INUTILIZADOS também é aceito
+            codigos, categorias = self._status_final_codigos(pos)
+            nomes = [ROTULOS_STATUS.get(c, c) for c in categorias]
+            status = {ROTULOS_STATUS.get(s, s) for s in status}
+            manter &= np.isin(codigos, [c for c, nome in enumerate(nomes) if nome in status])
+
+        if manter.all():
+            return self.df_geral()
+        return self.df_geral()[manter].reset_index(drop=True)
+
+    def df_divergencias(self):
+        def construir():
+            pos = self.divergencias
+            if len(pos) == 0:
+                return pd.DataFrame()
+            return pd.DataFrame({
+                "Chave": [self.lote.chaves[p] for p in pos.tolist()],
+                "Nota": self.lote.numeros_np(pos),
+                "Status XML": "AUTORIZADA",
+                "Status Real": "CANCELADA"
+            })
+        return self._em_cache("divergencias", construir)
+
+    def st_counts(self):
+        return {
+            "CANCELADOS": len(self._canceladas),
+            "INUTILIZADOS": self._qtd_inutilizadas,
+            "AUTORIZADAS": len(self._autorizadas)
+        }
+
+    def abas_relatorio(self):
+        # Abas gravadas no relatório depois da Filtrado
+        return {
+            'Resumo': self.df_resumo(),
+            'Faltantes': self.df_faltantes(),
+            'Canceladas': self.df_canceladas(),
+            'Divergências': self.df_divergencias()
+        }
+
+    def tabelas(self):
+        # Tabelas exibidas na tela; df_geral e df_autorizadas são montadas sob demanda
+        return {
+            'df_resumo': self.df_resumo(),
+            'df_faltantes': self.df_faltantes(),
+            'df_faixas_suspeitas': self.df_faixas_suspeitas(),
+            'df_canceladas': self.df_canceladas(),
+            'df_inutilizadas': self.df_inutilizadas(),
+            'df_divergencias': self.df_divergencias(),
+            'st_counts': self.st_counts()
+        }
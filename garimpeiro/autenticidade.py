@@ -0,0 +1,82 @@
+import csv
+import io
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+
+# --- RELATÓRIO DE AUTENTICIDADE (SEFAZ) ---
+# Coluna A = Chave, coluna F = Status, primeira linha = cabeçalho. O arquivo
+# é lido em blocos (xlsx em modo read_only, csv com chunksize), sem montar
+# a planilha inteira; sobra só a tabela Chave/Status das chaves com 44 dígitos.
+# Se a mesma chave aparece mais de uma vez, vale a última linha.
+
+COLUNA_CHAVE = 0
+COLUNA_STATUS = 5
+LINHAS_POR_BLOCO = 200000
+
+
+def _normalizar(chaves, status):
+    bloco = pd.DataFrame({
+        "Chave": pd.Series(chaves, dtype=object).fillna("").astype(str).str.strip(),
+        "Status": pd.Series(status, dtype=object).fillna("").astype(str).str.strip().str.upper()
+    })
+    return bloco[bloco["Chave"].str.len() == 44]
+
+
+def _blocos_xlsx(arquivo):
+    wb = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        chaves, status = [], []
+        for linha in ws.iter_rows(min_row=2, max_col=COLUNA_STATUS + 1, values_only=True):
+            chaves.append(linha[COLUNA_CHAVE] if len(linha) > COLUNA_CHAVE else None)
+            status.append(linha[COLUNA_STATUS] if len(linha) > COLUNA_STATUS else None)
+            if len(chaves) >= LINHAS_POR_BLOCO:
+                yield _normalizar(chaves, status)
+                chaves, status = [], []
+        if chaves:
+            yield _normalizar(chaves, status)
+    finally:
+        wb.close()
+
+
+def _blocos_csv(arquivo):
+    # Exportações da SEFAZ costumam vir com ";"; o separador é detectado na
+    # primeira linha. latin-1 nunca falha e a chave/status são ASCII.
+    texto = io.TextIOWrapper(arquivo, encoding="latin-1", newline="")
+    amostra = texto.readline()
+    texto.seek(0)
+    try:
+        separador = csv.Sniffer().sniff(amostra, delimiters=";,\t|").delimiter
+    except csv.Error:
+        separador = ";"
+    leitor = pd.read_csv(
+        texto, sep=separador, usecols=[COLUNA_CHAVE, COLUNA_STATUS], header=0,
+        dtype=str, keep_default_na=False, chunksize=LINHAS_POR_BLOCO
+    )
+    for bloco in leitor:
+        yield _normalizar(bloco.iloc[:, 0], bloco.iloc[:, 1])
+    texto.detach()
+
+
+def ler_relatorio_autenticidade(arquivo, nome=None):
+    # arquivo: caminho ou arquivo binário (ex.: upload do Streamlit)
+    nome = (nome or getattr(arquivo, "name", None) or str(arquivo)).lower()
+    if isinstance(arquivo, (str, os.PathLike)):
+        with open(arquivo, "rb") as f:
+            return ler_relatorio_autenticidade(f, nome)
+
+    if nome.endswith(".csv") or nome.endswith(".txt"):
+        blocos = list(_blocos_csv(arquivo))
+    elif nome.endswith(".xls"):
+        # Formato antigo: sem leitura em streaming, mas só as duas colunas
+        df = pd.read_excel(arquivo, usecols=[COLUNA_CHAVE, COLUNA_STATUS], dtype=str)
+        blocos = [_normalizar(df.iloc[:, 0], df.iloc[:, 1])]
+    else:
+        blocos = list(_blocos_xlsx(arquivo))
+
+    if not blocos:
+        return pd.DataFrame({"Chave": pd.Series(dtype=object), "Status": pd.Series(dtype=object)})
+    relatorio = pd.concat(blocos, ignore_index=True)
+    return relatorio.drop_duplicates("Chave", keep="last").reset_index(drop=True)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from .motor_xml import LIMITE_LEITURA, identify_xml_info, nome_xml_valido
+
+# --- CACHE PERSISTENTE DE LEITURA DOS XMLS ---
+# O resumo de um XML depende só dos primeiros LIMITE_LEITURA bytes e do CNPJ
+# do cliente; o hash dos dois é a chave do cache (o nome do arquivo não entra:
+# o mesmo XML enviado com outro nome também é reconhecido). Ao contrário dos
+# arquivos temp_garimpo_*, este banco sobrevive ao "RESETAR SISTEMA": os
+# mesmos XMLs de fornecedores reenviados mês a mês não são interpretados de novo.
+CACHE_DB = os.environ.get("GARIMPEIRO_CACHE", "cache_garimpeiro.sqlite")
+MAX_ENTRADAS_CACHE = int(os.environ.get("GARIMPEIRO_CACHE_MAX", "500000"))
+
+# XMLs consultados no banco de uma vez (abaixo do limite de parâmetros do sqlite)
+XMLS_POR_CONSULTA = 500
+# Um acerto só regrava o "uso" do LRU se a última marca tiver mais que isso
+RENOVAR_USO_NS = 24 * 3600 * 10**9
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS resumos (
+    digest BLOB PRIMARY KEY,
+    resumo TEXT,
+    is_p INTEGER NOT NULL,
+    uso INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_resumos_uso ON resumos (uso);
+CREATE TABLE IF NOT EXISTS estatisticas (
+    nome TEXT PRIMARY KEY,
+    valor INTEGER NOT NULL
+);
+"""
+
+
+def digest_documento(content_bytes, cnpj_limpo):
+    h = hashlib.blake2b(digest_size=20)
+    h.update(cnpj_limpo.encode())
+    h.update(b"\0")
+    h.update(content_bytes[:LIMITE_LEITURA])
+    return h.digest()
+
+
+class CacheResumos:
+    # Uma instância por garimpo: ela guarda as anotações da leitura em
+    # andamento. Nos workers o cache é aberto só para leitura e apenas anota
+    # acertos e novidades; o processo principal recebe essas anotações
+    # (absorver) e é o único que grava no banco (salvar), numa transação só.
+    def __init__(self, caminho=CACHE_DB, somente_leitura=False):
+        self.caminho = caminho
+        self.conn = None
+        if somente_leitura:
+            if os.path.exists(caminho):
+                self.conn = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True, timeout=30)
+        else:
+            self.conn = sqlite3.connect(caminho, timeout=30)
+            self.conn.executescript(_ESQUEMA)
+        # Banco vazio (primeiro garimpo): nem consulta, só anota as novidades
+        self.vazio = self.conn is None or self._vazio()
+        self.acertos = []
+        self.novos = []
+
+    def fechar(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _vazio(self):
+        try:
+            return self.conn.execute("SELECT 1 FROM resumos LIMIT 1").fetchone() is None
+        except sqlite3.Error:
+            return True
+
+    def _buscar(self, digests):
+        if self.vazio or not digests:
+            return {}
+        try:
+            return {
+                digest: (resumo, is_p, uso)
+                for digest, resumo, is_p, uso in self.conn.execute(
+                    f"SELECT digest, resumo, is_p, uso FROM resumos WHERE digest IN ({','.join('?' * len(digests))})",
+                    digests
+                )
+            }
+        except sqlite3.Error:
+            return {}
+
+    def identificar_lote(self, itens, cnpj):
+        # Mesmo contrato de identify_xml_info para cada (conteúdo, nome) de
+        # itens (até XMLS_POR_CONSULTA), com uma consulta ao banco para todos
+        cnpj_limpo = "".join(filter(str.isdigit, str(cnpj))) if cnpj else ""
+        digests = [
+            digest_documento(content_bytes, cnpj_limpo) if nome_xml_valido(os.path.basename(file_name)) else None
+            for content_bytes, file_name in itens
+        ]
+        linhas = self._buscar(list({d for d in digests if d is not None}))
+
+        resultados = []
+        for (content_bytes, file_name), digest in zip(itens, digests):
+            if digest is None:
+                resultados.append((None, False))
+                continue
+
+            linha = linhas.get(digest)
+            if linha is not None:
+                self.acertos.append((digest, linha[2]))
+                if linha[0] is None:
+                    resultados.append((None, False))
+                    continue
+                res = json.loads(linha[0])
+                res["Arquivo"] = os.path.basename(file_name)
+                res["Conteúdo"] = b""
+                if "Range" in res:
+                    res["Range"] = tuple(res["Range"])
+                resultados.append((res, bool(linha[1])))
+                continue
+
+            res, is_p = identify_xml_info(content_bytes, cnpj, file_name)
+            if res is None:
+                self.novos.append((digest, None, 0))
+            else:
+                guardado = {k: v for k, v in res.items() if k not in ("Arquivo", "Conteúdo")}
+                self.novos.append((digest, json.dumps(guardado), int(is_p)))
+            resultados.append((res, is_p))
+        return resultados
+
+    def anotacoes(self):
+        # Entrega (e zera) o que foi anotado desde a última chamada
+        anot = (self.novos, self.acertos)
+        self.novos, self.acertos = [], []
+        return anot
+
+    def absorver(self, novos, acertos):
+        self.novos.extend(novos)
+        self.acertos.extend(acertos)
+
+    def salvar(self, max_entradas=MAX_ENTRADAS_CACHE):
+        novos, acertos = self.anotacoes()
+        uso = time.time_ns()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO resumos (digest, resumo, is_p, uso) VALUES (?, ?, ?, ?)",
+                ((d, r, p, uso) for d, r, p in novos)
+            )
+            self.conn.executemany(
+                "UPDATE resumos SET uso = ? WHERE digest = ?",
+                ((uso, d) for d, uso_antigo in acertos if uso - uso_antigo > RENOVAR_USO_NS)
+            )
+            for nome, qtd in (("acertos", len(acertos)), ("falhas", len(novos))):
+                self.conn.execute(
+                    "INSERT INTO estatisticas VALUES (?, ?) ON CONFLICT(nome) DO UPDATE SET valor = valor + excluded.valor",
+                    (nome, qtd)
+                )
+
+            # LRU: descarta os menos usados recentemente até voltar ao teto
+            excesso = self.conn.execute("SELECT COUNT(*) FROM resumos").fetchone()[0] - max_entradas
+            if excesso > 0:
+                self.conn.execute(
+                    "DELETE FROM resumos WHERE digest IN (SELECT digest FROM resumos ORDER BY uso LIMIT ?)",
+                    (excesso,)
+                )
+        self.vazio = self._vazio()
+        return {"acertos": len(acertos), "falhas": len(novos)}
+
+    def estatisticas(self):
+        if self.conn is None:
+            return {"entradas": 0, "acertos": 0, "falhas": 0, "taxa_acerto": 0.0}
+        valores = dict(self.conn.execute("SELECT nome, valor FROM estatisticas").fetchall())
+        acertos = valores.get("acertos", 0)
+        falhas = valores.get("falhas", 0)
+        return {
+            "entradas": self.conn.execute("SELECT COUNT(*) FROM resumos").fetchone()[0],
+            "acertos": acertos,
+            "falhas": falhas,
+            "taxa_acerto": acertos / (acertos + falhas) if acertos + falhas else 0.0
+        }
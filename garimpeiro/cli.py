@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+
+from .garimpo import WORKERS_PADRAO
+
+# --- LINHA DE COMANDO ---
+# Uso: python -m garimpeiro audit --cnpj 00.000.000/0001-00 lote.zip [outro.zip ...] --out saida/
+# Os workers (spawn) reimportam este módulo como __main__; processamento,
+# que traz pandas e pyarrow, só é importado quando o comando roda.
+
+
+def _comando_audit(args):
+    cnpj_limpo = "".join(filter(str.isdigit, args.cnpj))
+    if len(cnpj_limpo) != 14:
+        print("CNPJ inválido.", file=sys.stderr)
+        return 2
+
+    faltando = [c for c in args.arquivos if not os.path.isfile(c)]
+    if faltando:
+        print(f"Arquivo não encontrado: {', '.join(faltando)}", file=sys.stderr)
+        return 2
+
+    def _progresso(feitas, total, nome):
+        if not args.quieto:
+            print(f"⛏️  [{feitas}/{total}] {nome}", file=sys.stderr)
+
+    from .processamento import auditar_arquivos
+
+    resultado = auditar_arquivos(
+        args.arquivos, cnpj_limpo, args.out,
+        workers=args.workers, usar_cache=not args.sem_cache, ao_progredir=_progresso,
+        formato_relatorio="." + args.formato
+    )
+
+    motor = resultado["auditoria"]
+    sc = motor.st_counts()
+    print(f"Documentos no lote: {len(motor)}")
+    print(f"Autorizadas (próprias): {sc['AUTORIZADAS']}")
+    print(f"Canceladas (próprias): {sc['CANCELADOS']}")
+    print(f"Inutilizadas (próprias): {sc['INUTILIZADOS']}")
+    print(f"Buracos: {len(motor.df_faltantes())}")
+    if not motor.df_faixas_suspeitas().empty:
+        print(f"Faixas suspeitas (não listadas nota a nota): {len(motor.df_faixas_suspeitas())}")
+    for caminho in resultado["ignorados"]:
+        print(f"Ignorado (conteúdo repetido): {caminho}")
+    for caminho in resultado["relatorios"]:
+        print(f"Relatório: {caminho}")
+    for parte in resultado["org_zip_parts"] + resultado["todos_zip_parts"]:
+        print(f"Pacote: {parte}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="garimpeiro", description="Garimpo e auditoria de XMLs fiscais sem interface")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    audit = sub.add_parser("audit", help="garimpa os arquivos, audita e gera os ZIPs organizados e o Excel")
+    audit.add_argument("arquivos", nargs="+", help="arquivos XML/ZIP do lote")
+    audit.add_argument("--cnpj", required=True, help="CNPJ do cliente")
+    audit.add_argument("--out", required=True, help="pasta onde os ZIPs e o relatório são gravados")
+    audit.add_argument("--formato", choices=["xlsx", "csv", "parquet"], default="xlsx",
+                       help="formato do relatório (csv/parquet para lotes acima do limite de linhas do Excel)")
+    audit.add_argument("--workers", type=int, default=WORKERS_PADRAO, help="processos usados na leitura dos XMLs")
+    audit.add_argument("--sem-cache", action="store_true", help="não usa o cache de leitura em disco")
+    audit.add_argument("--quieto", action="store_true", help="não mostra o progresso")
+    audit.set_defaults(func=_comando_audit)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,148 @@
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# --- ARMAZENAMENTO COLUNAR DO LOTE ---
+# Em vez de um dict de ~18 chaves por documento, cada campo vira uma coluna.
+# Campos de texto com poucos valores distintos (Tipo, Status, Pasta, Ano...)
+# guardam um código inteiro por linha e a lista de valores uma única vez;
+# números ficam em arrays tipados. Cada documento ocupa uma posição fixa
+# (a ordem de entrada no lote), que também é a ordem das tabelas.
+
+CAMPOS_CATEGORICOS = (
+    "Tipo", "Série", "Status", "Pasta", "Ano", "Mes", "Operacao",
+    "Data_Emissao", "CNPJ_Emit", "Nome_Emit", "Doc_Dest", "Nome_Dest"
+)
+
+# Ordem das chaves do resumo devolvido por identify_xml_info
+_ORDEM_RESUMO = (
+    "Arquivo", "Chave", "Tipo", "Série", "Número", "Status", "Pasta", "Valor", "Conteúdo",
+    "Ano", "Mes", "Operacao", "Data_Emissao", "CNPJ_Emit", "Nome_Emit", "Doc_Dest", "Nome_Dest"
+)
+
+
+class ColunaCategorica:
+    def __init__(self):
+        self.categorias = []
+        self._codigos = {}
+        self.codigos = array("i")
+
+    def codificar(self, valor):
+        codigo = self._codigos.get(valor)
+        if codigo is None:
+            codigo = self._codigos[valor] = len(self.categorias)
+            self.categorias.append(valor)
+        return codigo
+
+    def anexar(self, valor):
+        self.codigos.append(self.codificar(valor))
+
+    def definir(self, pos, valor):
+        self.codigos[pos] = self.codificar(valor)
+
+    def valor(self, pos):
+        return self.categorias[self.codigos[pos]]
+
+    def codigos_np(self, posicoes):
+        return np.frombuffer(self.codigos, dtype=np.int32)[posicoes]
+
+    def categorica(self, posicoes):
+        return pd.Categorical.from_codes(self.codigos_np(posicoes), categories=self.categorias)
+
+
+class LoteColunar:
+    def __init__(self):
+        self.posicao = {}
+        self.chaves = []
+        self.arquivos = []
+        self.numeros = array("q")
+        self.fins = array("q")
+        self.valores = array("d")
+        self.proprios = bytearray()
+        self.ativos = bytearray()
+        self.com_faixa = bytearray()
+        self.categoricas = {campo: ColunaCategorica() for campo in CAMPOS_CATEGORICOS}
+
+    def __len__(self):
+        return len(self.posicao)
+
+    def __contains__(self, chave):
+        return chave in self.posicao
+
+    def gravar(self, res, is_p):
+        # Inclui o documento no fim ou sobrescreve a posição da mesma chave
+        chave = res["Chave"]
+        inicio, fim = res.get("Range", (res["Número"], res["Número"]))
+        pos = self.posicao.get(chave)
+        if pos is None:
+            pos = self.posicao[chave] = len(self.chaves)
+            self.chaves.append(chave)
+            self.arquivos.append(res["Arquivo"])
+            self.numeros.append(res["Número"])
+            self.fins.append(fim)
+            self.valores.append(res["Valor"])
+            self.proprios.append(1 if is_p else 0)
+            self.ativos.append(1)
+            self.com_faixa.append(1 if "Range" in res else 0)
+            for campo, coluna in self.categoricas.items():
+                coluna.anexar(res[campo])
+        else:
+            self.arquivos[pos] = res["Arquivo"]
+            self.numeros[pos] = res["Número"]
+            self.fins[pos] = fim
+            self.valores[pos] = res["Valor"]
+            self.proprios[pos] = 1 if is_p else 0
+            self.com_faixa[pos] = 1 if "Range" in res else 0
+            for campo, coluna in self.categoricas.items():
+                coluna.definir(pos, res[campo])
+        return pos
+
+    def apagar(self, chave):
+        pos = self.posicao.pop(chave)
+        self.ativos[pos] = 0
+        self.chaves[pos] = None
+        self.arquivos[pos] = None
+        return pos
+
+    def valor(self, pos, campo):
+        return self.categoricas[campo].valor(pos)
+
+    def documento(self, pos):
+        # Remonta o resumo no formato de identify_xml_info
+        res = {}
+        for campo in _ORDEM_RESUMO:
+            if campo == "Arquivo":
+                res[campo] = self.arquivos[pos]
+            elif campo == "Chave":
+                res[campo] = self.chaves[pos]
+            elif campo == "Número":
+                res[campo] = self.numeros[pos]
+            elif campo == "Valor":
+                res[campo] = self.valores[pos]
+            elif campo == "Conteúdo":
+                res[campo] = b""
+            else:
+                res[campo] = self.categoricas[campo].valor(pos)
+        if self.com_faixa[pos]:
+            res["Range"] = (self.numeros[pos], self.fins[pos])
+        return res
+
+    def documentos(self):
+        for pos in self.posicao.values():
+            yield self.documento(pos)
+
+    def posicoes_ativas(self):
+        return np.flatnonzero(np.frombuffer(self.ativos, dtype=np.uint8))
+
+    def numeros_np(self, posicoes):
+        return np.frombuffer(self.numeros, dtype=np.int64)[posicoes]
+
+    def fins_np(self, posicoes):
+        return np.frombuffer(self.fins, dtype=np.int64)[posicoes]
+
+    def valores_np(self, posicoes):
+        return np.frombuffer(self.valores, dtype=np.float64)[posicoes]
+
+    def proprios_np(self, posicoes):
+        return np.frombuffer(self.proprios, dtype=np.uint8)[posicoes]
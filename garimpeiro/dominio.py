@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import pdfplumber
+
+from .garimpo import TEMP_EXTRACT_DIR, WORKERS_PADRAO
+
+# --- RELATÓRIO DOMÍNIO SISTEMAS (NOTAS NÃO LANÇADAS) ---
+# Cada linha do relatório traz "início fim série modelo"; as faixas ficam
+# como intervalos e são cruzadas com o lote por MotorAuditoria.localizar_faixas.
+_LINHA_FAIXA = re.compile(r'(\d+)\s+(\d+)\s+(\d+)\s+(?:NFe|NFCe|CTe|NF-e|NFC-e|CT-e)', re.IGNORECASE)
+
+# As páginas são lidas em blocos, cada bloco num processo (pdfplumber é
+# puro Python; relatórios de centenas de páginas espalham-se pelos núcleos)
+PAGINAS_POR_TAREFA = 10
+
+
+def faixas_do_texto(text):
+    return [(serie, int(inicio), int(fim)) for inicio, fim, serie in _LINHA_FAIXA.findall(text or "")]
+
+
+def _ler_paginas(caminho, numeros):
+    # [(página, faixas, situação), ...]; páginas sem nenhuma linha no formato
+    # da tabela (capa, totais) saem como "SEM TABELA" e não contam faixas.
+    resultados = []
+    with pdfplumber.open(caminho, pages=numeros) as pdf:
+        for numero, page in zip(numeros, pdf.pages):
+            try:
+                faixas = faixas_do_texto(page.extract_text())
+            except Exception as e:
+                resultados.append((numero, [], f"ERRO: {e}"))
+                continue
+            finally:
+                page.close()
+            resultados.append((numero, faixas, "OK" if faixas else "SEM TABELA"))
+    return resultados
+
+
+def _ler_tarefa(numeros, caminho):
+    try:
+        return _ler_paginas(caminho, numeros)
+    except Exception as e:
+        return [(numero, [], f"ERRO: {e}") for numero in numeros]
+
+
+def ler_relatorio_dominio(pdf_file, workers=WORKERS_PADRAO):
+    # Devolve (faixas na ordem do relatório, situação de cada página). Um PDF
+    # que nem abre levanta a exceção do pdfplumber.
+    temporario = None
+    if isinstance(pdf_file, (str, os.PathLike)):
+        caminho = pdf_file
+    else:
+        # Os workers abrem o PDF pelo caminho; uploads vão para um temporário
+        os.makedirs(TEMP_EXTRACT_DIR, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(suffix=".pdf", dir=TEMP_EXTRACT_DIR)
+        with os.fdopen(fd, "wb") as f_temp:
+            pdf_file.seek(0)
+            shutil.copyfileobj(pdf_file, f_temp)
+        caminho = temporario
+
+    try:
+        with pdfplumber.open(caminho) as pdf:
+            total = len(pdf.pages)
+        tarefas = [list(range(i, min(i + PAGINAS_POR_TAREFA, total + 1)))
+                   for i in range(1, total + 1, PAGINAS_POR_TAREFA)]
+
+        executor = None
+        if workers > 1 and len(tarefas) > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=min(workers, len(tarefas)),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        try:
+            if executor:
+                resultados = executor.map(_ler_tarefa, tarefas, repeat(caminho))
+            else:
+                resultados = map(_ler_tarefa, tarefas, repeat(caminho))
+
+            faixas, paginas = [], []
+            for bloco in resultados:
+                for numero, faixas_pagina, situacao in bloco:
+                    faixas.extend(faixas_pagina)
+                    paginas.append({"Página": numero, "Faixas": len(faixas_pagina), "Situação": situacao})
+        finally:
+            if executor:
+                executor.shutdown()
+    finally:
+        if temporario:
+            os.remove(temporario)
+
+    return faixas, paginas
+
+
+def extrair_notas_faltantes_dominio(pdf_file, workers=WORKERS_PADRAO):
+    # [(série, nota inicial, nota final), ...] na ordem do relatório
+    return ler_relatorio_dominio(pdf_file, workers)[0]
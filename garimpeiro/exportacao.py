@@ -0,0 +1,249 @@
+import multiprocessing
+import os
+import struct
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import repeat
+
+from .garimpo import MIN_XMLS_POR_WORKER, TEMP_UPLOADS_DIR, WORKERS_PADRAO
+from .indice import abrir_documentos
+
+# --- LIMITES DE EXPORTAÇÃO (PREVENÇÃO DE QUEDA DE MEMÓRIA) ---
+# Cada parte é fechada ao atingir este tamanho comprimido, seja de CT-e ou de NFC-e
+MAX_BYTES_PER_ZIP = int(os.environ.get("GARIMPEIRO_MAX_MB_ZIP", "20")) * 1024 * 1024
+# Cabeçalho local + entrada do diretório central de cada membro, fora os nomes
+_BYTES_POR_MEMBRO = zipfile.sizeFileHeader + zipfile.sizeCentralDir
+
+_BLOCO_COPIA = 1024 * 1024
+
+
+# --- CÓPIA BRUTA DE MEMBROS (SEM DESCOMPACTAR/RECOMPACTAR) ---
+def copiar_membro_bruto(z_origem, membro, z_destino, novo_nome):
+    # Copia os bytes já comprimidos (e o CRC) do ZIP de origem para o destino
+    # sob um novo nome. Devolve False quando o membro não pode ser copiado
+    # assim (criptografado ou com método diferente de deflate/stored).
+    info = z_origem.getinfo(membro)
+    if info.flag_bits & 0x1 or info.compress_type not in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED):
+        return False
+
+    fp = z_origem.fp
+    fp.seek(info.header_offset)
+    cabecalho = fp.read(zipfile.sizeFileHeader)
+    if len(cabecalho) != zipfile.sizeFileHeader or cabecalho[:4] != zipfile.stringFileHeader:
+        return False
+    campos = struct.unpack(zipfile.structFileHeader, cabecalho)
+    fp.seek(campos[zipfile._FH_FILENAME_LENGTH] + campos[zipfile._FH_EXTRA_FIELD_LENGTH], 1)
+
+    zinfo = zipfile.ZipInfo(novo_nome, date_time=info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    zinfo.external_attr = 0o600 << 16
+    zip64 = info.file_size > zipfile.ZIP64_LIMIT or info.compress_size > zipfile.ZIP64_LIMIT
+
+    with z_destino._lock:
+        if z_destino._writing:
+            raise ValueError("Há um membro aberto para escrita no ZIP de destino")
+        z_destino._writecheck(zinfo)
+        z_destino._didModify = True
+        z_destino.fp.seek(z_destino.start_dir)
+        zinfo.header_offset = z_destino.fp.tell()
+        z_destino.fp.write(zinfo.FileHeader(zip64))
+
+        restante = info.compress_size
+        while restante > 0:
+            bloco = fp.read(min(restante, _BLOCO_COPIA))
+            if not bloco:
+                raise zipfile.BadZipFile(f"Membro truncado: {membro}")
+            z_destino.fp.write(bloco)
+            restante -= len(bloco)
+
+        z_destino.filelist.append(zinfo)
+        z_destino.NameToInfo[zinfo.filename] = zinfo
+        z_destino.start_dir = z_destino.fp.tell()
+    return True
+
+
+def gravar_documento(z_destino, nome, z_origem=None, membro=None, xml_data=None):
+    # Membros de ZIP são copiados já comprimidos; XMLs soltos são compactados
+    if z_origem is not None and copiar_membro_bruto(z_origem, membro, z_destino, nome):
+        return
+    if xml_data is None:
+        xml_data = z_origem.read(membro)
+    z_destino.writestr(nome, xml_data)
+
+
+# --- PACOTES DIVIDIDOS EM PARTES ---
+# A seleção é fatiada antes de gravar, pelo tamanho comprimido registrado no
+# índice, e cada fatia vira uma parte de cada pacote. Com workers, cada parte
+# (organizada ou "só XML") é uma tarefa de um processo próprio; sem eles, as
+# duas partes da fatia saem da mesma leitura.
+def fatiar_por_tamanho(linhas, max_bytes=MAX_BYTES_PER_ZIP):
+    # Um documento maior que o limite fica sozinho numa parte
+    fatias = [[]]
+    ocupado = 0
+    for linha in linhas:
+        nome = f"{linha['pasta']}/{linha['arquivo']}"
+        tamanho = linha["tamanho"] + _BYTES_POR_MEMBRO + 2 * len(nome.encode())
+        if fatias[-1] and ocupado + tamanho > max_bytes:
+            fatias.append([])
+            ocupado = 0
+        fatias[-1].append(dict(linha))
+        ocupado += tamanho
+    return fatias
+
+
+def planejar_partes(linhas, prefixo_org, prefixo_todos, separar_pacotes, max_bytes=MAX_BYTES_PER_ZIP):
+    fatias = fatiar_por_tamanho(linhas, max_bytes)
+    tarefas = []
+    for i, fatia in enumerate(fatias):
+        destinos = [(f"{prefixo_org}_pt{i + 1}.zip", True), (f"{prefixo_todos}_pt{i + 1}.zip", False)]
+        if separar_pacotes:
+            tarefas.extend((fatia, [destino]) for destino in destinos)
+        else:
+            tarefas.append((fatia, destinos))
+    return tarefas
+
+
+def _gravar_partes(tarefa, pasta_uploads):
+    linhas, destinos = tarefa
+    with ExitStack() as pilha:
+        zips = [(pilha.enter_context(zipfile.ZipFile(nome_parte, "w", zipfile.ZIP_DEFLATED)), organizado)
+                for nome_parte, organizado in destinos]
+        for linha, z_origem, xml_data in abrir_documentos(linhas, pasta_uploads):
+            try:
+                for z, organizado in zips:
+                    nome = f"{linha['pasta']}/{linha['arquivo']}" if organizado else linha["arquivo"]
+                    gravar_documento(z, nome, z_origem, linha["membro"], xml_data)
+            except (KeyError, zipfile.BadZipFile):
+                continue
+    return destinos
+
+
+# --- EXPORTAÇÃO DOS PACOTES FINAIS ---
+def exportar_pacotes(linhas, prefixo_org="z_org_final", prefixo_todos="z_todos_final",
+                     pasta_uploads=TEMP_UPLOADS_DIR, workers=WORKERS_PADRAO):
+    # linhas: documentos do índice (indice.localizar_documentos). Gera o pacote
+    # organizado por pastas e o pacote "só XML"; devolve as listas de partes.
+    # Como no garimpo, lote pequeno vai serial.
+    linhas = list(linhas)
+    workers = min(workers, len(linhas) // MIN_XMLS_POR_WORKER)
+    tarefas = planejar_partes(linhas, prefixo_org, prefixo_todos, separar_pacotes=workers > 1)
+
+    executor = None
+    if workers > 1 and len(tarefas) > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=min(workers, len(tarefas)),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    org_parts, todos_parts = [], []
+    try:
+        if executor:
+            resultados = executor.map(_gravar_partes, tarefas, repeat(pasta_uploads))
+        else:
+            resultados = map(_gravar_partes, tarefas, repeat(pasta_uploads))
+
+        for destinos in resultados:
+            for nome_parte, organizado in destinos:
+                (org_parts if organizado else todos_parts).append(nome_parte)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return org_parts, todos_parts
+
+
+# --- RELATÓRIO (EXCEL, CSV OU PARQUET) ---
+# O Excel é gravado em disco no modo constant_memory do xlsxwriter: cada
+# linha vai direto para o arquivo e só a linha atual fica na memória. A aba
+# Filtrado é percorrida em blocos e as faixas de inutilização viram uma
+# linha por número só dentro de cada bloco. pandas, pyarrow e xlsxwriter são
+# importados só aqui dentro: os workers de _gravar_partes não precisam deles.
+LINHAS_POR_BLOCO = 50000
+MAX_LINHAS_EXCEL = 1048576 - 1  # fora o cabeçalho
+
+
+def _blocos_expandidos(df):
+    from .auditoria import expandir_faixas
+
+    for inicio in range(0, len(df), LINHAS_POR_BLOCO):
+        yield expandir_faixas(df.iloc[inicio:inicio + LINHAS_POR_BLOCO])
+
+
+def _escrever_aba(wb, nome, blocos, colunas):
+    # Passando do limite de linhas do Excel, continua em "Nome (2)", "Nome (3)"...
+    ws, linha, n_aba = None, MAX_LINHAS_EXCEL + 1, 0
+    cabecalho = wb.add_format({"bold": True})
+    for bloco in blocos:
+        valores = [bloco[c].tolist() for c in colunas]
+        for registro in zip(*valores):
+            if linha > MAX_LINHAS_EXCEL:
+                n_aba += 1
+                ws = wb.add_worksheet(nome if n_aba == 1 else f"{nome} ({n_aba})")
+                ws.write_row(0, 0, colunas, cabecalho)
+                linha = 1
+            ws.write_row(linha, 0, registro)
+            linha += 1
+    if ws is None:
+        ws = wb.add_worksheet(nome)
+        ws.write_row(0, 0, colunas, cabecalho)
+
+
+def gravar_relatorio_excel(df_geral, destino, abas=None):
+    # destino: caminho do .xlsx. abas: {nome: DataFrame} gravadas depois da
+    # Filtrado (ver MotorAuditoria.abas_relatorio).
+    import xlsxwriter
+
+    wb = xlsxwriter.Workbook(destino, {"constant_memory": True, "nan_inf_to_errors": True})
+    try:
+        colunas = [c for c in df_geral.columns if c != "Nota Final"]
+        _escrever_aba(wb, "Filtrado", _blocos_expandidos(df_geral), colunas)
+        for nome, df in (abas or {}).items():
+            _escrever_aba(wb, nome, [df], list(df.columns))
+    finally:
+        wb.close()
+    return [destino]
+
+
+def _gravar_csv(blocos, destino):
+    for i, bloco in enumerate(blocos):
+        primeiro = i == 0
+        bloco.to_csv(destino, mode="w" if primeiro else "a", header=primeiro, index=False,
+                     sep=";", encoding="utf-8-sig" if primeiro else "utf-8")
+
+
+def _gravar_parquet(blocos, destino):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    escritor = None
+    try:
+        for bloco in blocos:
+            tabela = pa.Table.from_pandas(bloco, preserve_index=False, schema=escritor.schema if escritor else None)
+            if escritor is None:
+                escritor = pq.ParquetWriter(destino, tabela.schema)
+            escritor.write_table(tabela)
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+def gravar_relatorio(df_geral, destino, abas=None):
+    # O formato sai da extensão do destino. CSV e Parquet não têm limite de
+    # linhas nem abas: cada aba extra vira um arquivo "<destino>_<aba>".
+    # Devolve os caminhos gravados.
+    base, extensao = os.path.splitext(destino)
+    if extensao.lower() == ".xlsx":
+        return gravar_relatorio_excel(df_geral, destino, abas)
+
+    gravar = _gravar_parquet if extensao.lower() == ".parquet" else _gravar_csv
+    gravar(_blocos_expandidos(df_geral) if len(df_geral) else [df_geral], destino)
+    caminhos = [destino]
+    for nome, df in (abas or {}).items():
+        caminho = f"{base}_{nome}{extensao}"
+        gravar([df], caminho)
+        caminhos.append(caminho)
+    return caminhos
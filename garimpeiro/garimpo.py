@@ -0,0 +1,272 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from itertools import islice, repeat
+
+from .cache_xml import XMLS_POR_CONSULTA, CacheResumos
+from .motor_xml import LIMITE_LEITURA, identify_xml_info
+
+# --- VARIÁVEIS DE SISTEMA DE ARQUIVOS (PREVENÇÃO DE QUEDA DE MEMÓRIA) ---
+TEMP_EXTRACT_DIR = "temp_garimpo_zips"
+TEMP_UPLOADS_DIR = "temp_garimpo_uploads"
+
+# --- PARALELISMO DO GARIMPO ---
+# Cada ZIP enviado é fatiado em tarefas de até MEMBROS_POR_TAREFA entradas,
+# para que um único pacote grande também se espalhe por todos os núcleos.
+MEMBROS_POR_TAREFA = 2000
+# Subir um worker custa uns décimos de segundo; o pool só é usado quando
+# cada worker recebe pelo menos isso de XMLs (lote menor vai serial)
+MIN_XMLS_POR_WORKER = 5000
+WORKERS_PADRAO = int(os.environ.get("GARIMPEIRO_WORKERS", "0")) or os.cpu_count() or 1
+
+# Uploads são copiados para o disco em blocos deste tamanho (RAM limitada)
+BLOCO_UPLOAD = 8 * 1024 * 1024
+
+# Cancelamento/inutilização sempre substituem o registro já minerado da mesma chave
+STATUS_PRIORITARIOS = ["CANCELADOS", "INUTILIZADOS"]
+
+
+# --- GRAVAÇÃO DOS UPLOADS EM DISCO ---
+def nome_disponivel(nome, digests):
+    # Nome com que gravar um upload: o próprio, ou com prefixo numérico se um
+    # arquivo diferente de mesmo nome (ex.: lote.zip de outra pasta) já está
+    # em digests, para não sobrescrever o anterior
+    nome = candidato = os.path.basename(nome)
+    n = len(digests)
+    while candidato in digests:
+        n += 1
+        candidato = f"{n:04d}_{nome}"
+    return candidato
+
+
+def salvar_upload(arquivo, digests, pasta=TEMP_UPLOADS_DIR, nome=None):
+    # Copia o upload em blocos calculando o SHA-256 no caminho. digests
+    # (nome salvo -> hash) é atualizado aqui; devolve o caminho gravado, ou
+    # None quando um arquivo com o mesmo conteúdo já está no lote. nome: com
+    # que nome gravar (padrão: o nome do próprio arquivo).
+    os.makedirs(pasta, exist_ok=True)
+    nome = nome or os.path.basename(arquivo.name)
+    destino = os.path.join(pasta, nome)
+    parcial = destino + ".parcial"
+    h = hashlib.sha256()
+
+    arquivo.seek(0)
+    with open(parcial, "wb") as out_f:
+        while True:
+            bloco = arquivo.read(BLOCO_UPLOAD)
+            if not bloco:
+                break
+            h.update(bloco)
+            out_f.write(bloco)
+
+    digest = h.hexdigest()
+    if digest in digests.values():
+        os.remove(parcial)
+        return None
+
+    os.replace(parcial, destino)
+    digests[nome] = digest
+    return destino
+
+
+# --- ZIPS ANINHADOS ---
+# O ZIP interno é lido do próprio membro para um buffer: em memória até
+# LIMITE_ZIP_INTERNO_RAM, acima disso num temporário anônimo que some ao
+# fechar. Nada é extraído com nome nem precisa ser apagado depois.
+LIMITE_ZIP_INTERNO_RAM = int(os.environ.get("GARIMPEIRO_ZIP_RAM_MB", "64")) * 1024 * 1024
+
+
+@contextmanager
+def abrir_zip_interno(z, sub_nome):
+    os.makedirs(TEMP_EXTRACT_DIR, exist_ok=True)
+    with tempfile.SpooledTemporaryFile(max_size=LIMITE_ZIP_INTERNO_RAM, dir=TEMP_EXTRACT_DIR) as buffer:
+        with z.open(sub_nome) as membro:
+            shutil.copyfileobj(membro, buffer, BLOCO_UPLOAD)
+        buffer.seek(0)
+        yield buffer
+
+
+@contextmanager
+def abrir_cadeia(z, cadeia):
+    # Desce pela sequência de ZIPs internos e entrega o ZipFile mais profundo
+    with ExitStack() as pilha:
+        atual = z
+        for sub_nome in cadeia:
+            f_interno = pilha.enter_context(abrir_zip_interno(atual, sub_nome))
+            atual = pilha.enter_context(zipfile.ZipFile(f_interno))
+        yield atual
+
+
+# --- FUNÇÃO RECURSIVA OTIMIZADA PARA DISCO ---
+def percorrer_arquivo(conteudo_ou_file, nome_arquivo, membros=None, cadeia=(), limite=None):
+    # Como extrair_recursivo, mas informa onde cada XML está: a cadeia de ZIPs
+    # internos até ele, o nome do membro dentro do ZIP mais profundo e quantos
+    # bytes ele ocupa comprimido (XML solto: o tamanho sem compressão).
+    # Com limite, cada XML é aberto como stream e só os primeiros bytes são
+    # descompactados; o conteúdo inteiro fica para a exportação.
+    if nome_arquivo.lower().endswith('.zip'):
+        try:
+            if hasattr(conteudo_ou_file, 'read'):
+                file_obj = conteudo_ou_file
+            else:
+                file_obj = io.BytesIO(conteudo_ou_file)
+
+            with zipfile.ZipFile(file_obj) as z:
+                for sub_nome in (membros if membros is not None else z.namelist()):
+                    if sub_nome.startswith('__MACOSX') or os.path.basename(sub_nome).startswith('.'):
+                        continue
+
+                    if sub_nome.lower().endswith('.zip'):
+                        with abrir_zip_interno(z, sub_nome) as f_temp:
+                            yield from percorrer_arquivo(f_temp, sub_nome, cadeia=cadeia + (sub_nome,), limite=limite)
+                    elif sub_nome.lower().endswith('.xml'):
+                        with z.open(sub_nome) as membro:
+                            xml_data = membro.read(limite) if limite else membro.read()
+                        yield (os.path.basename(sub_nome), xml_data, cadeia, sub_nome, z.getinfo(sub_nome).compress_size)
+        except:
+            pass
+
+    elif nome_arquivo.lower().endswith('.xml'):
+        if hasattr(conteudo_ou_file, 'read'):
+            xml_data = conteudo_ou_file.read(limite) if limite else conteudo_ou_file.read()
+            tamanho = conteudo_ou_file.seek(0, os.SEEK_END) if limite else len(xml_data)
+        else:
+            xml_data = conteudo_ou_file[:limite] if limite else conteudo_ou_file
+            tamanho = len(conteudo_ou_file)
+        yield (os.path.basename(nome_arquivo), xml_data, cadeia, "", tamanho)
+
+
+def extrair_recursivo(conteudo_ou_file, nome_arquivo, membros=None):
+    for name, xml_data, *_ in percorrer_arquivo(conteudo_ou_file, nome_arquivo, membros):
+        yield (name, xml_data)
+
+
+def ler_upload(caminho, cnpj, membros=None, cache=None):
+    # (res, is_p, localização) de cada XML reconhecido num upload salvo em disco.
+    # identify_xml_info só olha os primeiros LIMITE_LEITURA bytes, então só
+    # eles são lidos; o XML inteiro sai do upload na exportação.
+    upload = os.path.basename(caminho)
+    with open(caminho, "rb") as file_obj:
+        for (name, _, cadeia, membro, tamanho), (res, is_p) in _identificar(
+            percorrer_arquivo(file_obj, upload, membros, limite=LIMITE_LEITURA), cnpj, cache
+        ):
+            if res:
+                yield res, is_p, (upload, cadeia, membro, tamanho)
+
+
+def _identificar(xmls, cnpj, cache):
+    # Pares (xml, (res, is_p)). Com cache, os XMLs vão em blocos de
+    # XMLS_POR_CONSULTA: uma consulta ao banco por bloco, não por XML.
+    if cache is None:
+        for xml in xmls:
+            yield xml, identify_xml_info(xml[1], cnpj, xml[0])
+        return
+    while True:
+        bloco = list(islice(xmls, XMLS_POR_CONSULTA))
+        if not bloco:
+            return
+        yield from zip(bloco, cache.identificar_lote([(xml_data, name) for name, xml_data, *_ in bloco], cnpj))
+
+
+# --- REGRA DE PRECEDÊNCIA DO LOTE ---
+def registrar_no_lote(lote_dict, res, is_p):
+    key = res["Chave"]
+    if key in lote_dict:
+        if res["Status"] in STATUS_PRIORITARIOS:
+            lote_dict[key] = (res, is_p)
+    else:
+        lote_dict[key] = (res, is_p)
+
+
+# --- DIVISÃO DOS UPLOADS EM TAREFAS ---
+def planejar_tarefas(caminhos):
+    tarefas = []
+    for caminho in caminhos:
+        if caminho.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(caminho) as z:
+                    nomes = z.namelist()
+            except:
+                continue
+            for i in range(0, len(nomes), MEMBROS_POR_TAREFA):
+                tarefas.append((caminho, nomes[i:i + MEMBROS_POR_TAREFA]))
+        else:
+            tarefas.append((caminho, None))
+    return tarefas
+
+
+def xmls_estimados(tarefas):
+    # XML solto conta 1; um ZIP dentro do ZIP conta como uma tarefa cheia
+    total = 0
+    for _, membros in tarefas:
+        if membros is None:
+            total += 1
+        else:
+            total += sum(MEMBROS_POR_TAREFA if m.lower().endswith('.zip') else 1 for m in membros)
+    return total
+
+
+def _garimpar_tarefa(tarefa, cnpj, caminho_cache=None):
+    # Devolve os achados e as anotações do cache (novos resumos, acertos),
+    # que só o processo principal grava.
+    caminho, membros = tarefa
+    cache = CacheResumos(caminho_cache, somente_leitura=True) if caminho_cache else None
+    achados = []
+    try:
+        achados.extend(ler_upload(caminho, cnpj, membros, cache))
+    except:
+        pass
+    if cache is None:
+        return achados, ([], [])
+    cache.fechar()
+    return achados, cache.anotacoes()
+
+
+# --- GARIMPO (SERIAL OU EM POOL DE PROCESSOS) ---
+def garimpar_lote(caminhos, cnpj, workers=WORKERS_PADRAO, ao_progredir=None, ao_registrar=None, cache=None):
+    # Os achados de cada tarefa são aplicados na ordem dos uploads, então o
+    # resultado é idêntico ao da leitura sequencial, arquivo por arquivo.
+    # ao_registrar recebe todas as ocorrências (inclusive chaves repetidas)
+    # com a localização física de cada XML. Com cache (CacheResumos), XMLs
+    # já vistos não são interpretados de novo; gravar o cache (cache.salvar)
+    # fica a cargo de quem chamou.
+    tarefas = planejar_tarefas(caminhos)
+    caminho_cache = cache.caminho if cache is not None else None
+    lote_dict = {}
+
+    workers = min(workers, len(tarefas), xmls_estimados(tarefas) // MIN_XMLS_POR_WORKER)
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    try:
+        if executor:
+            # XMLs soltos são uma tarefa cada: vão em lotes para o worker
+            resultados = executor.map(_garimpar_tarefa, tarefas, repeat(cnpj), repeat(caminho_cache),
+                                      chunksize=max(1, len(tarefas) // (workers * 8)))
+        else:
+            resultados = map(_garimpar_tarefa, tarefas, repeat(cnpj), repeat(caminho_cache))
+
+        for i, (achados, anotacoes) in enumerate(resultados):
+            if cache is not None:
+                cache.absorver(*anotacoes)
+            for res, is_p, _ in achados:
+                registrar_no_lote(lote_dict, res, is_p)
+            if ao_registrar:
+                ao_registrar(achados)
+            if ao_progredir:
+                ao_progredir(i + 1, len(tarefas), os.path.basename(tarefas[i][0]))
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return lote_dict
@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+import zipfile
+from itertools import groupby
+
+from .garimpo import TEMP_UPLOADS_DIR, abrir_cadeia
+
+# --- ÍNDICE FÍSICO DOS DOCUMENTOS ---
+# O garimpo grava aqui cada XML reconhecido (inclusive chaves repetidas, como
+# a nota e o seu evento de cancelamento) com os campos já extraídos e o local
+# exato do arquivo. Exportação e cruzamento Domínio leem só o que precisam.
+INDICE_DB = "temp_garimpo_indice.sqlite"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    id INTEGER PRIMARY KEY,
+    chave TEXT NOT NULL,
+    arquivo TEXT NOT NULL,
+    pasta TEXT NOT NULL,
+    tipo TEXT,
+    serie TEXT,
+    numero INTEGER,
+    status TEXT,
+    ano TEXT,
+    mes TEXT,
+    cnpj_emit TEXT,
+    valor REAL,
+    upload TEXT NOT NULL,
+    aninhado TEXT NOT NULL,
+    membro TEXT NOT NULL,
+    tamanho INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_documentos_chave ON documentos (chave);
+CREATE INDEX IF NOT EXISTS ix_documentos_numero ON documentos (numero, serie, tipo);
+"""
+
+_INSERT = """
+INSERT INTO documentos (
+    chave, arquivo, pasta, tipo, serie, numero, status, ano, mes, cnpj_emit, valor, upload, aninhado, membro, tamanho
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def abrir_indice(caminho=INDICE_DB, recriar=False):
+    if recriar and os.path.exists(caminho):
+        os.remove(caminho)
+    conn = sqlite3.connect(caminho)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_ESQUEMA)
+    return conn
+
+
+def registrar_documentos(conn, achados):
+    # achados: [(res, is_p, (upload, cadeia, membro, tamanho)), ...] como em garimpo.ler_upload
+    conn.executemany(_INSERT, [
+        (
+            res["Chave"], res["Arquivo"], res["Pasta"], res["Tipo"], res["Série"], res["Número"],
+            res["Status"], res["Ano"], res["Mes"], res["CNPJ_Emit"], res["Valor"],
+            upload, json.dumps(list(cadeia)), membro, tamanho
+        )
+        for res, _, (upload, cadeia, membro, tamanho) in achados
+    ])
+
+
+def localizar_documentos(chaves, caminho=INDICE_DB):
+    # Todas as ocorrências das chaves pedidas, na ordem em que foram garimpadas
+    if not os.path.exists(caminho):
+        return []
+    conn = abrir_indice(caminho)
+    try:
+        conn.execute("CREATE TEMP TABLE selecao (chave TEXT PRIMARY KEY)")
+        conn.executemany("INSERT OR IGNORE INTO selecao VALUES (?)", ((c,) for c in chaves))
+        return conn.execute(
+            "SELECT d.* FROM documentos d JOIN selecao s ON s.chave = d.chave ORDER BY d.id"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+# --- PENEIRA (BUSCA PONTUAL NO ÍNDICE) ---
+# Chave (inteira ou só o começo) e número (com modelo/série opcionais) caem
+# cada um num índice do sqlite; nada do lote é relido para responder.
+LIMITE_PENEIRA = 200
+
+
+def buscar_documentos(chave=None, numero=None, tipo=None, serie=None, limite=LIMITE_PENEIRA, caminho=INDICE_DB):
+    condicoes, parametros = [], []
+    if chave:
+        # Prefixo como intervalo [prefixo, sucessor) para usar o índice (LIKE não usa)
+        condicoes.append("chave >= ? AND chave < ?")
+        parametros.extend((chave, chave[:-1] + chr(ord(chave[-1]) + 1)))
+    if numero is not None:
+        condicoes.append("numero = ?")
+        parametros.append(int(numero))
+    if serie is not None:
+        condicoes.append("serie = ?")
+        parametros.append(str(serie))
+    if tipo:
+        condicoes.append("tipo = ?")
+        parametros.append(tipo)
+    if not condicoes or not os.path.exists(caminho):
+        return []
+
+    conn = abrir_indice(caminho)
+    try:
+        return conn.execute(
+            f"SELECT * FROM documentos WHERE {' AND '.join(condicoes)} ORDER BY chave, id LIMIT ?", (*parametros, limite)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def abrir_documentos(linhas, pasta_uploads=TEMP_UPLOADS_DIR):
+    # (linha, zip de origem, conteúdo) de cada documento localizado. Membros de
+    # ZIP vêm com o ZipFile aberto (conteúdo None) para permitir cópia bruta;
+    # XMLs soltos vêm com o conteúdo já lido. Cada arquivo enviado e cada ZIP
+    # interno é aberto uma única vez por grupo consecutivo de linhas.
+    for (upload, aninhado), grupo in groupby(linhas, key=lambda l: (l["upload"], l["aninhado"])):
+        caminho = os.path.join(pasta_uploads, upload)
+        try:
+            if not upload.lower().endswith('.zip'):
+                with open(caminho, "rb") as f:
+                    xml_data = f.read()
+                for linha in grupo:
+                    yield linha, None, xml_data
+                continue
+
+            with zipfile.ZipFile(caminho) as z:
+                with abrir_cadeia(z, json.loads(aninhado)) as z_interno:
+                    for linha in grupo:
+                        yield linha, z_interno, None
+        except Exception:
+            continue
+
+
+def ler_documentos(linhas, pasta_uploads=TEMP_UPLOADS_DIR):
+    for linha, z_origem, xml_data in abrir_documentos(linhas, pasta_uploads):
+        if z_origem is not None:
+            try:
+                xml_data = z_origem.read(linha["membro"])
+            except Exception:
+                continue
+        yield linha, xml_data
+
+
+def ler_documento(linha, pasta_uploads=TEMP_UPLOADS_DIR):
+    # Só o XML pedido: o ZipFile vai pelo diretório central direto ao membro
+    for _, xml_data in ler_documentos([linha], pasta_uploads):
+        return xml_data
+    return None
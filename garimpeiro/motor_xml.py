@@ -0,0 +1,196 @@
+import os
+import re
+
+# --- MOTOR DE IDENTIFICAÇÃO (PADRÕES PRÉ-COMPILADOS SOBRE BYTES) ---
+# Só o início do documento é analisado: os dados de identificação ficam no
+# cabeçalho e os itens (<det>) podem ocupar megabytes.
+LIMITE_LEITURA = 45000
+
+# Cada padrão é compilado uma única vez e executado no máximo uma vez por
+# documento. As buscas dependentes (<emit>, <dest>) partem da posição da tag
+# âncora em vez de varrer o prefixo inteiro com ".*?".
+_RE_TPNF = re.compile(rb'<tpnf>([01])</tpnf>')
+_RE_CNPJ = re.compile(rb'<cnpj>(\d+)</cnpj>')
+_RE_DOC = re.compile(rb'<(?:cnpj|cpf)>(.*?)</(?:cnpj|cpf)>', re.S)
+_RE_DATA = re.compile(rb'<(?:dhemi|demi|dhregevento|dhrecbto)>(\d{4})-(\d{2})-(\d{2})')
+_RE_SERIE = re.compile(rb'<serie>(\d+)</')
+_RE_NNFINI = re.compile(rb'<nnfini>(\d+)</')
+_RE_NNFFIN = re.compile(rb'<nnffin>(\d+)</')
+_RE_ANO = re.compile(rb'<ano>(\d+)</')
+_RE_CHAVE = re.compile(rb'<(?:chnfe|chcte|chmdfe)>(\d{44})</')
+_RE_ID = re.compile(rb'id=["\'](?:nfe|cte|mdfe)?(\d{44})["\']')
+_RE_VALOR = re.compile(rb'<(?:vnf|vtprest|vreceb)>([\d.]+)</')
+
+# Marcadores de modelo e tipo: uma varredura devolve todas as ocorrências,
+# em vez de um teste "in" por valor possível. Os códigos de evento seguem
+# como teste "in": 110110 e 110111 podem se sobrepor numa sequência de
+# dígitos e uma varredura sem sobreposição perderia o segundo.
+_RE_MOD = re.compile(rb'<mod>(\d+)</mod>')
+_RE_INF = re.compile(rb'<inf(cte|mdfe)')
+
+
+def _texto(valor):
+    return valor.decode('utf-8', errors='ignore')
+
+
+def _buscar(regex, tag_l, inicio=0):
+    m = regex.search(tag_l, inicio)
+    return _texto(m.group(1)) if m else None
+
+
+def _nome_apos(tag_l, inicio):
+    p = tag_l.find(b'<xnome>', inicio)
+    if p < 0:
+        return ""
+    p += 7
+    fim = tag_l.find(b'</xnome>', p)
+    return _texto(tag_l[p:fim]).upper() if fim >= 0 else ""
+
+
+def extrair_partes(tag_l):
+    # (CNPJ_Emit, Nome_Emit, Doc_Dest, Nome_Dest) a partir das âncoras <emit>/<dest>
+    cnpj_emit = nome_emit = doc_dest = nome_dest = ""
+
+    p = tag_l.find(b'<emit>')
+    if p >= 0:
+        cnpj_emit = _buscar(_RE_CNPJ, tag_l, p + 6) or ""
+        nome_emit = _nome_apos(tag_l, p + 6)
+
+    p = tag_l.find(b'<dest>')
+    if p >= 0:
+        doc_dest = _buscar(_RE_DOC, tag_l, p + 6) or ""
+        nome_dest = _nome_apos(tag_l, p + 6)
+
+    return cnpj_emit, nome_emit, doc_dest, nome_dest
+
+
+def nome_xml_valido(nome_puro):
+    return not (nome_puro.startswith('.') or nome_puro.startswith('~') or not nome_puro.lower().endswith('.xml'))
+
+
+def identify_xml_info(content_bytes, client_cnpj, file_name):
+    client_cnpj_clean = "".join(filter(str.isdigit, str(client_cnpj))) if client_cnpj else ""
+    nome_puro = os.path.basename(file_name)
+    if not nome_xml_valido(nome_puro):
+        return None, False
+
+    resumo = {
+        "Arquivo": nome_puro,
+        "Chave": "",
+        "Tipo": "Outros",
+        "Série": "0",
+        "Número": 0,
+        "Status": "NORMAIS",
+        "Pasta": "",
+        "Valor": 0.0,
+        "Conteúdo": b"",
+        "Ano": "0000",
+        "Mes": "00",
+        "Operacao": "SAIDA",
+        "Data_Emissao": "",
+        "CNPJ_Emit": "",
+        "Nome_Emit": "",
+        "Doc_Dest": "",
+        "Nome_Dest": ""
+    }
+
+    try:
+        tag_l = content_bytes[:LIMITE_LEITURA].lower()
+        if b'<?xml' not in tag_l and b'<inf' not in tag_l and b'<inut' not in tag_l and b'<retinut' not in tag_l:
+            return None, False
+
+        # Identificação de tpNF (0=Entrada, 1=Saída)
+        if _buscar(_RE_TPNF, tag_l) == "0":
+            resumo["Operacao"] = "ENTRADA"
+
+        # Extração de Dados das Partes
+        resumo["CNPJ_Emit"], resumo["Nome_Emit"], resumo["Doc_Dest"], resumo["Nome_Dest"] = extrair_partes(tag_l)
+
+        # Data de Emissão Genérica
+        data_match = _RE_DATA.search(tag_l)
+        if data_match:
+            ano, mes, dia = (_texto(g) for g in data_match.groups())
+            resumo["Data_Emissao"] = f"{ano}-{mes}-{dia}"
+            resumo["Ano"] = ano
+            resumo["Mes"] = mes
+
+        modelos = set(_RE_MOD.findall(tag_l))
+
+        # 1. IDENTIFICAÇÃO DE INUTILIZADAS
+        if b'inut' in tag_l and (b'<inutnfe' in tag_l or b'<retinutnfe' in tag_l or b'<procinut' in tag_l):
+            resumo["Status"] = "INUTILIZADOS"
+            resumo["Tipo"] = "NF-e"
+
+            if b'65' in modelos:
+                resumo["Tipo"] = "NFC-e"
+            elif b'57' in modelos:
+                resumo["Tipo"] = "CT-e"
+
+            resumo["Série"] = _buscar(_RE_SERIE, tag_l) or "0"
+            ini = _buscar(_RE_NNFINI, tag_l) or "0"
+            fin = _buscar(_RE_NNFFIN, tag_l) or ini
+
+            resumo["Número"] = int(ini)
+            resumo["Range"] = (int(ini), int(fin))
+
+            if resumo["Ano"] == "0000":
+                ano_inut = _buscar(_RE_ANO, tag_l)
+                if ano_inut:
+                    resumo["Ano"] = "20" + ano_inut[-2:]
+
+            resumo["Chave"] = f"INUT_{resumo['Série']}_{ini}"
+
+        else:
+            resumo["Chave"] = _buscar(_RE_CHAVE, tag_l) or _buscar(_RE_ID, tag_l) or ""
+
+            if resumo["Chave"] and len(resumo["Chave"]) == 44:
+                resumo["Ano"] = "20" + resumo["Chave"][2:4]
+                resumo["Mes"] = resumo["Chave"][4:6]
+                resumo["Série"] = str(int(resumo["Chave"][22:25]))
+                resumo["Número"] = int(resumo["Chave"][25:34])
+
+                if not resumo["Data_Emissao"]:
+                    resumo["Data_Emissao"] = f"{resumo['Ano']}-{resumo['Mes']}-01"
+
+            infs = set(_RE_INF.findall(tag_l)) if b'65' not in modelos else set()
+            tipo = "NF-e"
+            if b'65' in modelos:
+                tipo = "NFC-e"
+            elif b'57' in modelos or b'cte' in infs:
+                tipo = "CT-e"
+            elif b'58' in modelos or b'mdfe' in infs:
+                tipo = "MDF-e"
+
+            status = "NORMAIS"
+            if b'110111' in tag_l or b'<cstat>101</cstat>' in tag_l:
+                status = "CANCELADOS"
+            elif b'110110' in tag_l:
+                status = "CARTA_CORRECAO"
+
+            resumo["Tipo"] = tipo
+            resumo["Status"] = status
+
+            if status == "NORMAIS":
+                valor = _buscar(_RE_VALOR, tag_l)
+                resumo["Valor"] = float(valor) if valor else 0.0
+
+        if not resumo["CNPJ_Emit"] and resumo["Chave"] and not resumo["Chave"].startswith("INUT_"):
+            resumo["CNPJ_Emit"] = resumo["Chave"][6:20]
+
+        if resumo["Mes"] == "00":
+            resumo["Mes"] = "01"
+
+        if resumo["Ano"] == "0000":
+            resumo["Ano"] = "2000"
+
+        is_p = (resumo["CNPJ_Emit"] == client_cnpj_clean)
+
+        if is_p:
+            resumo["Pasta"] = f"EMITIDOS_CLIENTE/{resumo['Operacao']}/{resumo['Tipo']}/{resumo['Status']}/{resumo['Ano']}/{resumo['Mes']}/Serie_{resumo['Série']}"
+        else:
+            resumo["Pasta"] = f"RECEBIDOS_TERCEIROS/{resumo['Operacao']}/{resumo['Tipo']}/{resumo['Ano']}/{resumo['Mes']}"
+
+        return resumo, is_p
+
+    except Exception as e:
+        return None, False
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+
+from .auditoria import MotorAuditoria
+from .cache_xml import CacheResumos
+from .exportacao import exportar_pacotes, gravar_relatorio
+from .garimpo import WORKERS_PADRAO, garimpar_lote, nome_disponivel, salvar_upload
+from .indice import abrir_indice, localizar_documentos, registrar_documentos
+
+# --- PROCESSAMENTO EM LOTE (SEM INTERFACE) ---
+# Mesmo fluxo do botão "INICIAR GRANDE GARIMPO" seguido da exportação sem
+# filtros: copia os arquivos para uma pasta de trabalho, garimpa, audita e
+# grava os ZIPs organizados e o relatório Excel na pasta de saída.
+
+
+def auditar_arquivos(arquivos, cnpj, pasta_saida, workers=WORKERS_PADRAO, usar_cache=True, ao_progredir=None,
+                     formato_relatorio=".xlsx"):
+    cnpj_limpo = "".join(filter(str.isdigit, str(cnpj)))
+    os.makedirs(pasta_saida, exist_ok=True)
+    pasta_trabalho = tempfile.mkdtemp(prefix="garimpo_", dir=pasta_saida)
+    pasta_uploads = os.path.join(pasta_trabalho, "uploads")
+    caminho_indice = os.path.join(pasta_trabalho, "indice.sqlite")
+
+    try:
+        digests = {}
+        ignorados = []
+        for caminho in arquivos:
+            # Mesmo nome vindo de outra pasta (clienteA/lote.zip, clienteB/lote.zip)
+            # ganha um prefixo em vez de sobrescrever o anterior
+            with open(caminho, "rb") as f:
+                if salvar_upload(f, digests, pasta_uploads, nome_disponivel(caminho, digests)) is None:
+                    ignorados.append(caminho)
+        salvos = [os.path.join(pasta_uploads, nome) for nome in digests]
+
+        conn_indice = abrir_indice(caminho_indice, recriar=True)
+        cache = CacheResumos() if usar_cache else None
+        try:
+            lote_dict = garimpar_lote(
+                salvos, cnpj_limpo, workers=workers,
+                ao_progredir=ao_progredir,
+                ao_registrar=lambda achados: registrar_documentos(conn_indice, achados),
+                cache=cache
+            )
+            conn_indice.commit()
+            stats_cache = cache.salvar() if cache is not None else None
+        finally:
+            conn_indice.close()
+            if cache is not None:
+                cache.fechar()
+
+        motor = MotorAuditoria()
+        motor.carregar(lote_dict)
+        df_geral = motor.df_geral()
+
+        relatorios = gravar_relatorio(df_geral, os.path.join(pasta_saida, "relatorio" + formato_relatorio), motor.abas_relatorio())
+
+        chaves = set(df_geral["Chave"].tolist()) if not df_geral.empty else set()
+        org_parts, todos_parts = exportar_pacotes(
+            localizar_documentos(chaves, caminho_indice),
+            prefixo_org=os.path.join(pasta_saida, "z_org_final"),
+            prefixo_todos=os.path.join(pasta_saida, "z_todos_final"),
+            pasta_uploads=pasta_uploads,
+            workers=workers
+        )
+    finally:
+        shutil.rmtree(pasta_trabalho, ignore_errors=True)
+
+    return {
+        "auditoria": motor,
+        "relatorios": relatorios,
+        "org_zip_parts": org_parts,
+        "todos_zip_parts": todos_parts,
+        "ignorados": ignorados,
+        "cache": stats_cache
+    }
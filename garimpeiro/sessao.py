@@ -0,0 +1,181 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+from array import array
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .auditoria import MotorAuditoria
+from .colunar import LoteColunar
+from .garimpo import TEMP_UPLOADS_DIR
+from .indice import INDICE_DB
+
+# --- SNAPSHOT DA SESSÃO (PARQUET + MANIFESTO) ---
+# Guarda o lote já garimpado e o estado da auditoria (status da SEFAZ,
+# divergências, inutilizações manuais) numa pasta por sessão, junto com os
+# uploads e o índice físico, para que a exportação continue funcionando
+# depois de restaurar. Restaurar não relê nenhum XML: as colunas do lote
+# voltam direto do Parquet e as tabelas derivadas são refeitas pelo motor.
+# Como o cache de leitura, esta pasta sobrevive ao "RESETAR SISTEMA".
+PASTA_SESSOES = os.environ.get("GARIMPEIRO_SESSOES", "sessoes_garimpeiro")
+VERSAO_SNAPSHOT = 1
+
+ARQUIVO_LOTE = "lote.parquet"
+ARQUIVO_MANIFESTO = "manifesto.json"
+ARQUIVO_INDICE = "indice.sqlite"
+PASTA_UPLOADS = "uploads"
+
+
+def _tabela_do_lote(motor):
+    # Só as posições ativas, na ordem do lote; as posições são renumeradas
+    # e por isso status da SEFAZ e divergências viram colunas
+    lote = motor.lote
+    pos = lote.posicoes_ativas()
+    colunas = {
+        "Chave": pa.array([lote.chaves[p] for p in pos.tolist()], pa.string()),
+        "Arquivo": pa.array([lote.arquivos[p] for p in pos.tolist()], pa.string()),
+        "Número": pa.array(lote.numeros_np(pos)),
+        "Fim": pa.array(lote.fins_np(pos)),
+        "Valor": pa.array(lote.valores_np(pos)),
+        "Próprio": pa.array(lote.proprios_np(pos).astype(bool)),
+        "Faixa": pa.array(np.frombuffer(lote.com_faixa, dtype=np.uint8)[pos].astype(bool)),
+    }
+    for campo, coluna in lote.categoricas.items():
+        colunas[campo] = pa.DictionaryArray.from_arrays(coluna.codigos_np(pos), pa.array(coluna.categorias))
+    colunas["Status SEFAZ"] = pa.array([motor.status_sefaz.get(p) for p in pos.tolist()], pa.string())
+    colunas["Divergente"] = pa.array(np.isin(pos, motor.divergencias))
+    return pa.table(colunas)
+
+
+def _lote_da_tabela(tabela):
+    lote = LoteColunar()
+    if not tabela.num_rows:
+        return lote
+    tabela = tabela.unify_dictionaries().combine_chunks()
+    lote.chaves = tabela.column("Chave").to_pylist()
+    lote.arquivos = tabela.column("Arquivo").to_pylist()
+    lote.posicao = dict(zip(lote.chaves, range(len(lote.chaves))))
+    lote.numeros = array("q", tabela.column("Número").to_numpy().astype(np.int64).tobytes())
+    lote.fins = array("q", tabela.column("Fim").to_numpy().astype(np.int64).tobytes())
+    lote.valores = array("d", tabela.column("Valor").to_numpy().astype(np.float64).tobytes())
+    lote.proprios = bytearray(tabela.column("Próprio").to_numpy(zero_copy_only=False).astype(np.uint8).tobytes())
+    lote.com_faixa = bytearray(tabela.column("Faixa").to_numpy(zero_copy_only=False).astype(np.uint8).tobytes())
+    lote.ativos = bytearray(b"\x01" * len(lote.chaves))
+    for campo, coluna in lote.categoricas.items():
+        dicionario = tabela.column(campo).chunk(0)
+        coluna.categorias = dicionario.dictionary.to_pylist()
+        coluna._codigos = {valor: codigo for codigo, valor in enumerate(coluna.categorias)}
+        coluna.codigos = array("i", dicionario.indices.to_numpy().astype(np.int32).tobytes())
+    return lote
+
+
+def _vincular(origem, destino):
+    # Hard link quando origem e destino estão no mesmo disco (instantâneo e
+    # sem ocupar espaço); senão, cópia
+    try:
+        os.link(origem, destino)
+    except OSError:
+        shutil.copy2(origem, destino)
+
+
+def _copiar_indice(origem, destino):
+    # API de backup do sqlite: cópia consistente mesmo com o banco aberto
+    conn_origem = sqlite3.connect(origem)
+    conn_destino = sqlite3.connect(destino)
+    try:
+        conn_origem.backup(conn_destino)
+    finally:
+        conn_destino.close()
+        conn_origem.close()
+
+
+def salvar_sessao(motor, nome, estado=None, pasta_uploads=TEMP_UPLOADS_DIR, caminho_indice=INDICE_DB,
+                  pasta=PASTA_SESSOES):
+    # estado: dict JSON com o que mais a tela precisar de volta (CNPJ, hashes
+    # dos uploads...). Grava numa pasta temporária e só então troca pela
+    # definitiva; devolve o caminho da sessão.
+    destino = os.path.join(pasta, nome)
+    parcial = destino + ".parcial"
+    shutil.rmtree(parcial, ignore_errors=True)
+    os.makedirs(os.path.join(parcial, PASTA_UPLOADS))
+    try:
+        tabela = _tabela_do_lote(motor)
+        pq.write_table(tabela, os.path.join(parcial, ARQUIVO_LOTE))
+
+        uploads = sorted(os.listdir(pasta_uploads)) if os.path.isdir(pasta_uploads) else []
+        uploads = [nome_up for nome_up in uploads if not nome_up.endswith(".parcial")]
+        for nome_up in uploads:
+            _vincular(os.path.join(pasta_uploads, nome_up), os.path.join(parcial, PASTA_UPLOADS, nome_up))
+        if os.path.exists(caminho_indice):
+            _copiar_indice(caminho_indice, os.path.join(parcial, ARQUIVO_INDICE))
+
+        manifesto = {
+            "versao": VERSAO_SNAPSHOT,
+            "nome": nome,
+            "criado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "documentos": tabela.num_rows,
+            "uploads": uploads,
+            "estado": estado or {}
+        }
+        with open(os.path.join(parcial, ARQUIVO_MANIFESTO), "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=2)
+
+        shutil.rmtree(destino, ignore_errors=True)
+        os.replace(parcial, destino)
+    except Exception:
+        shutil.rmtree(parcial, ignore_errors=True)
+        raise
+    return destino
+
+
+def listar_sessoes(pasta=PASTA_SESSOES):
+    # Manifestos das sessões salvas, da mais recente para a mais antiga
+    manifestos = []
+    if not os.path.isdir(pasta):
+        return manifestos
+    for nome in os.listdir(pasta):
+        caminho = os.path.join(pasta, nome, ARQUIVO_MANIFESTO)
+        try:
+            with open(caminho, encoding="utf-8") as f:
+                manifesto = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if manifesto.get("versao") == VERSAO_SNAPSHOT:
+            manifestos.append(manifesto)
+    return sorted(manifestos, key=lambda m: m["criado_em"], reverse=True)
+
+
+def restaurar_sessao(nome, pasta_uploads=TEMP_UPLOADS_DIR, caminho_indice=INDICE_DB, pasta=PASTA_SESSOES):
+    # Devolve (motor, manifesto). Uploads e índice voltam para os caminhos de
+    # trabalho, substituindo o que houver lá.
+    origem = os.path.join(pasta, nome)
+    with open(os.path.join(origem, ARQUIVO_MANIFESTO), encoding="utf-8") as f:
+        manifesto = json.load(f)
+    if manifesto.get("versao") != VERSAO_SNAPSHOT:
+        raise ValueError(f"Sessão {nome} gravada em outra versão ({manifesto.get('versao')})")
+
+    tabela = pq.read_table(os.path.join(origem, ARQUIVO_LOTE))
+    motor = MotorAuditoria()
+    motor.lote = _lote_da_tabela(tabela)
+    status_sefaz = tabela.column("Status SEFAZ").to_pylist()
+    motor.status_sefaz = {pos: status for pos, status in enumerate(status_sefaz) if status}
+    motor.divergencias = np.flatnonzero(tabela.column("Divergente").to_numpy(zero_copy_only=False)).astype(np.int64)
+    motor.reconstruir()
+
+    shutil.rmtree(pasta_uploads, ignore_errors=True)
+    os.makedirs(pasta_uploads)
+    for nome_up in manifesto["uploads"]:
+        _vincular(os.path.join(origem, PASTA_UPLOADS, nome_up), os.path.join(pasta_uploads, nome_up))
+    if os.path.exists(caminho_indice):
+        os.remove(caminho_indice)
+    if os.path.exists(os.path.join(origem, ARQUIVO_INDICE)):
+        _copiar_indice(os.path.join(origem, ARQUIVO_INDICE), caminho_indice)
+    return motor, manifesto
+
+
+def apagar_sessao(nome, pasta=PASTA_SESSOES):
+    shutil.rmtree(os.path.join(pasta, nome), ignore_errors=True)